@@ -0,0 +1,87 @@
+import collections
+import time
+import typing
+
+
+class TTLCache:
+    """A bounded LRU cache whose entries expire a fixed number of seconds after being set.
+
+    The cache is bounded by its number of entries and, with `max_bytes`, by the sizes given for them.
+
+    Entries can be tagged, e.g. with the ClickUp containers they were built from,
+    so that a write to a container invalidates every entry that includes it.
+    """
+
+    def __init__(self, *, maxsize: int, ttl: float, max_bytes: int | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: collections.OrderedDict[typing.Hashable, tuple[float, typing.Any]] = collections.OrderedDict()
+        self._sizes: dict[typing.Hashable, int] = {}
+        # tag -> keys of the entries with that tag, and key -> tags of the entry.
+        self._tags: dict[typing.Hashable, set[typing.Hashable]] = collections.defaultdict(set)
+        self._entry_tags: dict[typing.Hashable, tuple[typing.Hashable, ...]] = {}
+        # Incremented by every invalidation, so that a value fetched while one happened can be left out.
+        self.invalidations = 0
+
+    def get(self, key: typing.Hashable, default: typing.Any = None) -> typing.Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+
+        expires, value = entry
+        if expires <= time.monotonic():
+            self.pop(key)
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(
+            self, key: typing.Hashable, value: typing.Any, *, ttl: float | None = None,
+            tags: typing.Iterable[typing.Hashable] = (), size: int = 0
+    ) -> None:
+        self.pop(key)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        ttl = self.ttl if ttl is None else ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._sizes[key] = size
+        self.size += size
+        self._entry_tags[key] = tuple(tags)
+        for tag in self._entry_tags[key]:
+            self._tags[tag].add(key)
+        while len(self._entries) > self.maxsize or (self.max_bytes is not None and self.size > self.max_bytes):
+            self.pop(next(iter(self._entries)))
+
+    def pop(self, key: typing.Hashable, default: typing.Any = None) -> typing.Any:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+
+        self.size -= self._sizes.pop(key, 0)
+        for tag in self._entry_tags.pop(key, ()):
+            self._tags[tag].discard(key)
+            if not self._tags[tag]:
+                del self._tags[tag]
+        return entry[1]
+
+    def invalidate(self, tag: typing.Hashable) -> int:
+        """Remove every entry tagged with `tag`, returning how many were removed."""
+        self.invalidations += 1
+        keys = self._tags.pop(tag, set())
+        for key in keys:
+            self.pop(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._sizes.clear()
+        self.size = 0
+        self._tags.clear()
+        self._entry_tags.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,16 +1,30 @@
+import asyncio
+import collections
+import contextlib
+import hashlib
+import os
+import time
+import typing
 from urllib.parse import quote_plus
 
 import httpx
 from starlette.requests import Request
 
+from jsonstream import ArrayItemDecoder
+from ratelimit import RateLimiter
+
+# Times a request is retried after ClickUp answers 429 Too Many Requests.
+MAX_RETRIES = int(os.environ.get('CLICKUP_MAX_RETRIES', 3))
+
 
 class ClickupClient(httpx.AsyncClient):
 
     BASE_URL = 'https://api.clickup.com/api/v2'
 
-    def __init__(self, api_key: str):
-        super().__init__()
+    def __init__(self, api_key: str, **kwargs):
+        super().__init__(**kwargs)
         self.api_key = api_key
+        self.rate_limiter = RateLimiter()
 
     @classmethod
     def api_key(cls, request: Request):
@@ -31,20 +45,178 @@ class ClickupClient(httpx.AsyncClient):
                 result += '?' + '&'.join(args)
         return result
 
+    async def api_request(self, method: typing.Literal['get', 'post'], url: str, **kwargs) -> httpx.Response:
+        """Make a request within the token's rate limit, retrying (after a backoff) when rate limited anyway."""
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            response = await getattr(self, method)(url, headers={'Authorization': self.api_key}, **kwargs)
+            self.rate_limiter.update(response.headers)
+            if response.status_code != 429 or attempt >= MAX_RETRIES:
+                return response
+            self.rate_limiter.backoff(response.headers, attempt)
+            attempt += 1
+
+    @contextlib.asynccontextmanager
+    async def api_stream(self, url: str) -> typing.AsyncIterator[httpx.Response]:
+        """Like api_request('get', url), with the response body read as it's consumed."""
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            async with self.stream('GET', url, headers={'Authorization': self.api_key}) as response:
+                self.rate_limiter.update(response.headers)
+                if response.status_code != 429 or attempt >= MAX_RETRIES:
+                    yield response
+                    return
+            self.rate_limiter.backoff(response.headers, attempt)
+            attempt += 1
+
     @classmethod
     async def api_get(cls, request: Request, url: str, params: dict = None):
         api_key = cls.api_key(request)
-        async with cls(api_key) as client:
-            url = client.url(url, params)
-            response = await client.get(url, headers={'Authorization': client.api_key})
+        async with client_pool.client(api_key) as client:
+            response = await client.api_request('get', client.url(url, params))
             response.raise_for_status()
             return response.json()
 
     @classmethod
     async def api_post(cls, request: Request, url: str, data: dict = None):
         api_key = cls.api_key(request)
-        async with cls(api_key) as client:
-            url = client.url(url)
-            response = await client.post(url, headers={'Authorization': client.api_key}, json=data)
+        async with client_pool.client(api_key) as client:
+            response = await client.api_request('post', client.url(url), json=data)
             response.raise_for_status()
             return response.json()
+
+    @classmethod
+    async def api_get_items(
+            cls, request: Request, url: str, params: dict = None, *, key: str,
+            transform: typing.Callable[[dict], typing.Any] = None
+    ):
+        """Like api_get for a response with an array of objects under `key`, e.g. the tasks of a list.
+
+        The objects are decoded one at a time while the response is received and passed through `transform`,
+        so only the transformed objects are kept.
+        """
+        api_key = cls.api_key(request)
+        async with client_pool.client(api_key) as client:
+            async with client.api_stream(client.url(url, params)) as response:
+                response.raise_for_status()
+                decoder = ArrayItemDecoder(key)
+                items = []
+                async for text in response.aiter_text():
+                    for item in decoder.feed(text):
+                        items.append(transform(item) if transform else item)
+                result = decoder.close()
+                result[key] = items
+                return result
+
+    @classmethod
+    async def api_get_pages(
+            cls, request: Request, url: str, params: dict = None, *, page: int = 0, prefetch: int = 4,
+            max_pages: int = None, key: str = None, transform: typing.Callable[[dict], typing.Any] = None
+    ) -> typing.AsyncIterator[dict]:
+        """Yield the pages of a paginated endpoint in order, starting at `page`, until `last_page`
+        (or `max_pages` pages).
+        The first page is requested on its own; once a page says it isn't the last one, up to `prefetch` page
+        requests are kept in flight ahead of the consumer.
+        With `key`, pages are decoded as they are received as in api_get_items."""
+        end = page + max_pages if max_pages else None
+
+        def get(number: int) -> asyncio.Future:
+            page_params = {**(params or {}), 'page': number}
+            if key:
+                return asyncio.ensure_future(
+                    cls.api_get_items(request, url, params=page_params, key=key, transform=transform)
+                )
+            return asyncio.ensure_future(cls.api_get(request, url, params=page_params))
+
+        pending: collections.deque[asyncio.Future] = collections.deque([get(page)])
+        page += 1
+        try:
+            while pending:
+                result = await pending.popleft()
+                last_page = result.get('last_page', True)
+                if not last_page:
+                    while len(pending) < prefetch and (end is None or page < end):
+                        pending.append(get(page))
+                        page += 1
+                yield result
+                if last_page:
+                    return
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class ClickupClientPool:
+    """Long-lived ClickupClients, one per API key (stored by hash), so calls reuse their tenant's connections.
+
+    At most `max_clients` clients are kept, evicting the least recently used one, and clients idle for
+    more than `idle_timeout` seconds are closed.  Each client gets an equal share of `max_connections`.
+    A client that is evicted while in use is closed once its last call finishes.
+    """
+
+    def __init__(self, *, max_clients: int, max_connections: int, idle_timeout: float):
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        per_client = max(1, max_connections // max_clients)
+        self.limits = httpx.Limits(max_connections=per_client, max_keepalive_connections=per_client)
+        # key -> [client, number of calls using it, last used]
+        self._clients: collections.OrderedDict[str, list] = collections.OrderedDict()
+        self._retired: set[ClickupClient] = set()
+
+    @staticmethod
+    def key(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode()).hexdigest()
+
+    @contextlib.asynccontextmanager
+    async def client(self, api_key: str) -> typing.AsyncIterator[ClickupClient]:
+        await self._evict_idle()
+
+        key = self.key(api_key)
+        entry = self._clients.get(key)
+        if entry is None or entry[0].is_closed:
+            entry = self._clients[key] = [ClickupClient(api_key, limits=self.limits), 0, time.monotonic()]
+        self._clients.move_to_end(key)
+        while len(self._clients) > self.max_clients:
+            _, evicted = self._clients.popitem(last=False)
+            await self._retire(evicted)
+
+        client = entry[0]
+        entry[1] += 1
+        try:
+            yield client
+        finally:
+            entry[1] -= 1
+            entry[2] = time.monotonic()
+            if not entry[1] and client in self._retired:
+                self._retired.discard(client)
+                await client.aclose()
+
+    async def _retire(self, entry: list) -> None:
+        client, in_use, _ = entry
+        if in_use:
+            self._retired.add(client)
+        else:
+            await client.aclose()
+
+    async def _evict_idle(self) -> None:
+        now = time.monotonic()
+        for key, entry in list(self._clients.items()):
+            if not entry[1] and now - entry[2] > self.idle_timeout:
+                del self._clients[key]
+                await entry[0].aclose()
+
+    async def aclose(self) -> None:
+        entries = list(self._clients.values())
+        self._clients.clear()
+        self._retired.clear()
+        for client, _, _ in entries:
+            await client.aclose()
+
+
+client_pool = ClickupClientPool(
+    max_clients=int(os.environ.get('CLICKUP_MAX_CLIENTS', 32)),
+    max_connections=int(os.environ.get('CLICKUP_MAX_CONNECTIONS', 256)),
+    idle_timeout=float(os.environ.get('CLICKUP_CLIENT_IDLE_TIMEOUT', 300)),
+)
@@ -0,0 +1,64 @@
+import re
+import typing
+
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+URL_PATTERN = re.compile(r'^https?://\S+$', re.IGNORECASE)
+
+NUMERIC_TYPES = {'number', 'currency', 'emoji', 'date'}
+# Values of these fields are computed by ClickUp.
+READ_ONLY_TYPES = {'formula', 'automatic_progress', 'rollup'}
+# Values of these fields are lists or objects.
+STRUCTURED_TYPES = {'labels', 'users', 'tasks', 'location', 'attachment', 'list_relationship', 'manual_progress'}
+
+
+def is_number(value: typing.Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def check_value(field: dict, value: typing.Any) -> str | None:
+    """Why `value` can't be set on a custom field with the given definition, or None if it looks valid."""
+    field_type = field.get('type')
+    name = field.get('name') or field.get('id')
+
+    if field_type in READ_ONLY_TYPES:
+        return f"Custom field '{name}' ({field_type}) is computed by ClickUp and can't be set"
+    if field_type in NUMERIC_TYPES and not is_number(value):
+        return f"Custom field '{name}' ({field_type}) requires a number, got {value!r}"
+    if field_type == 'checkbox' and str(value).lower() not in ('true', 'false', '1', '0'):
+        return f"Custom field '{name}' (checkbox) requires true or false, got {value!r}"
+    if field_type == 'email' and not EMAIL_PATTERN.match(str(value)):
+        return f"Custom field '{name}' (email) requires an email address, got {value!r}"
+    if field_type == 'url' and not URL_PATTERN.match(str(value)):
+        return f"Custom field '{name}' (url) requires an http(s) URL, got {value!r}"
+    if field_type == 'drop_down':
+        options = field.get('type_config', {}).get('options', [])
+        allowed = {str(option.get('id')) for option in options} | {str(option.get('orderindex')) for option in options}
+        if str(value) not in allowed:
+            choices = ', '.join(f"{option.get('name')} ({option.get('id')})" for option in options)
+            return f"Custom field '{name}' (drop_down) requires the id of one of its options: {choices}"
+    if field_type in STRUCTURED_TYPES:
+        return f"Custom field '{name}' ({field_type}) can't be set with a single value"
+    return None
+
+
+def validate(definitions: typing.List[dict], custom_fields: typing.List[dict]) -> typing.List[str]:
+    """Problems with the custom field values of a task, given the field definitions of its list."""
+    by_id = {field.get('id'): field for field in definitions}
+    errors = []
+    for custom_field in custom_fields:
+        field = by_id.get(custom_field.get('id'))
+        if field is None:
+            errors.append(f"Unknown custom field id '{custom_field.get('id')}' for this list")
+            continue
+        error = check_value(field, custom_field.get('value'))
+        if error:
+            errors.append(error)
+    return errors
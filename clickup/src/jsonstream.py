@@ -0,0 +1,92 @@
+import json
+import re
+import typing
+
+TOKEN = re.compile(r'["{}\[\]]')
+STRING_END = re.compile(r'["\\]')
+
+
+class ArrayItemDecoder:
+    """Incrementally decodes the objects of the array under `key` of a JSON object received in chunks.
+
+    Each object is decoded as soon as it is complete, and its text is dropped, so only one object of the
+    array exists at a time.  The rest of the JSON object is returned by close() with the array left empty.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.buffer = ''
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.string_start = 0
+        # The last top-level string and where it ended, to recognize `"<key>": [`.
+        self.last_string: str | None = None
+        self.last_string_end = 0
+        self.in_array = False
+        self.item_start: int | None = None
+        # Text of the JSON object outside the array.
+        self.outside: list[str] = []
+
+    def feed(self, text: str) -> list[typing.Any]:
+        """Add the next chunk of text, returning the objects it completed."""
+        self.buffer += text
+        items = []
+        buffer, pos = self.buffer, self.pos
+        while True:
+            if self.in_string:
+                match = STRING_END.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(buffer):
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self.in_string = False
+                pos = match.end()
+                if self.depth == 1 and not self.in_array:
+                    self.last_string = buffer[self.string_start + 1:match.start()]
+                    self.last_string_end = pos
+                continue
+
+            match = TOKEN.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            token, pos = match.group(), match.end()
+            if token == '"':
+                self.in_string = True
+                self.string_start = match.start()
+            elif token in '{[':
+                self.depth += 1
+                if (
+                        token == '[' and self.depth == 2 and not self.outside and self.last_string == self.key
+                        and buffer[self.last_string_end:match.start()].strip() == ':'
+                ):
+                    self.in_array = True
+                    self.outside.append(buffer[:pos])
+                    buffer, pos = buffer[pos:], 0
+                elif self.in_array and self.depth == 3:
+                    self.item_start = match.start()
+            else:
+                self.depth -= 1
+                if self.in_array and self.depth == 2 and self.item_start is not None:
+                    items.append(json.loads(buffer[self.item_start:pos]))
+                    buffer, pos = buffer[pos:], 0
+                    self.item_start = None
+                elif self.in_array and self.depth == 1:
+                    self.in_array = False
+                    buffer, pos = buffer[match.start():], 1
+
+        if self.in_array and self.item_start is None:
+            # Only separators are left between items.
+            buffer, pos = buffer[pos:], 0
+        self.buffer, self.pos = buffer, pos
+        return items
+
+    def close(self) -> dict:
+        """The JSON object without the items of the array."""
+        return json.loads(''.join(self.outside) + self.buffer)
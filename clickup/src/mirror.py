@@ -0,0 +1,238 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS lists (
+    tenant TEXT NOT NULL,
+    list_id TEXT NOT NULL,
+    date_updated INTEGER NOT NULL DEFAULT 0,
+    synced_at REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant, list_id)
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    tenant TEXT NOT NULL,
+    id TEXT NOT NULL,
+    list_id TEXT NOT NULL,
+    status TEXT,
+    date_updated INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (tenant, id)
+);
+CREATE TABLE IF NOT EXISTS webhooks (
+    id TEXT PRIMARY KEY,
+    tenant TEXT NOT NULL,
+    workspace_id TEXT NOT NULL,
+    secret TEXT NOT NULL,
+    events TEXT NOT NULL DEFAULT '["*"]'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_index USING fts5(
+    tenant UNINDEXED, id UNINDEXED, name, description, tags, status
+);
+'''
+
+# Fields of a task kept in the mirror and returned by searches.
+TASK_FIELDS = ['id', 'custom_id', 'name', 'status', 'tags', 'assignees', 'due_date', 'date_updated', 'url', 'list']
+# Fields of a task needed to store it, i.e. including the (indexed but not kept) description.
+MIRRORED_FIELDS = [*TASK_FIELDS, 'text_content', 'description']
+
+
+def mirrored(task: dict) -> dict:
+    return {key: task[key] for key in MIRRORED_FIELDS if key in task}
+
+
+def task_record(task: dict) -> dict:
+    """The part of a ClickUp task that is kept, with nested objects reduced to their names."""
+    record = {key: task[key] for key in TASK_FIELDS if task.get(key) is not None}
+    if isinstance(record.get('status'), dict):
+        record['status'] = record['status'].get('status')
+    if 'tags' in record:
+        record['tags'] = [tag.get('name') for tag in record['tags']]
+    if 'assignees' in record:
+        record['assignees'] = [
+            {'id': user.get('id'), 'username': user.get('username')} for user in record['assignees']
+        ]
+    if isinstance(record.get('list'), dict):
+        record['list'] = {'id': record['list'].get('id'), 'name': record['list'].get('name')}
+    return record
+
+
+def match_expression(query: str) -> str:
+    """An FTS5 query matching all the words of `query` (as prefixes), without FTS5 syntax getting in the way."""
+    terms = ['"' + term.replace('"', '""') + '"*' for term in query.split()]
+    return ' AND '.join(terms)
+
+
+class TaskMirror:
+    """Local copy of the tasks of selected ClickUp lists in SQLite, with a full-text index.
+
+    Every row belongs to a tenant (a hash of the API key), and every query is restricted to one tenant.
+    The webhooks registered through the server are kept here too, since their secrets have to outlive the process.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.RLock()
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        """The database connection, opened (and the schema created) on first use."""
+        with self._lock:
+            if self._connection is None:
+                if self.path != ':memory:':
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                connection.row_factory = sqlite3.Row
+                if self.path != ':memory:':
+                    connection.execute('PRAGMA journal_mode=WAL')
+                connection.executescript(SCHEMA)
+                self._connection = connection
+            return self._connection
+
+    def date_updated(self, tenant: str, list_id: str) -> int | None:
+        """The latest date_updated (epoch milliseconds) among the synced tasks of a list, or None if never synced."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT date_updated FROM lists WHERE tenant = ? AND list_id = ?', (tenant, list_id)
+            ).fetchone()
+        return None if row is None else row['date_updated']
+
+    def upsert(self, tenant: str, list_id: str, tasks: typing.Iterable[dict]) -> int:
+        """Store (or replace) tasks of a list, returning how many were stored."""
+        count = 0
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                for task in tasks:
+                    record = task_record(task)
+                    description = task.get('text_content') or task.get('description')
+                    date_updated = int(task.get('date_updated') or 0)
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO tasks (tenant, id, list_id, status, date_updated, data) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        (tenant, record['id'], list_id, record.get('status'), date_updated, json.dumps(record))
+                    )
+                    self._db.execute('DELETE FROM tasks_index WHERE tenant = ? AND id = ?', (tenant, record['id']))
+                    self._db.execute(
+                        'INSERT INTO tasks_index (tenant, id, name, description, tags, status) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        (
+                            tenant, record['id'], record.get('name'), description,
+                            ' '.join(filter(None, record.get('tags', []))), record.get('status')
+                        )
+                    )
+                    count += 1
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        return count
+
+    def delete(self, tenant: str, task_id: str) -> int:
+        """Remove a task, returning how many tasks were removed."""
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                count = self._db.execute('DELETE FROM tasks WHERE tenant = ? AND id = ?', (tenant, task_id)).rowcount
+                self._db.execute('DELETE FROM tasks_index WHERE tenant = ? AND id = ?', (tenant, task_id))
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        return count
+
+    def move(self, tenant: str, task_id: str, list_id: str | None, list_name: str | None = None) -> int:
+        """Move a task to another list, or remove it if that list isn't mirrored (or unknown).
+        Returns how many tasks were moved or removed."""
+        with self._lock:
+            mirrored_list = list_id is not None and self._db.execute(
+                'SELECT 1 FROM lists WHERE tenant = ? AND list_id = ?', (tenant, list_id)
+            ).fetchone()
+            if not mirrored_list:
+                return self.delete(tenant, task_id)
+            return self._db.execute(
+                "UPDATE tasks SET list_id = ?, data = json_set(data, '$.list', json_object('id', ?, 'name', ?)) "
+                'WHERE tenant = ? AND id = ?', (list_id, list_id, list_name, tenant, task_id)
+            ).rowcount
+
+    def synced(self, tenant: str, list_id: str, date_updated: int) -> None:
+        """Record that the tasks of a list updated up to `date_updated` are stored, as of now."""
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO lists (tenant, list_id, date_updated, synced_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (tenant, list_id) DO UPDATE SET '
+                'date_updated = MAX(date_updated, excluded.date_updated), synced_at = excluded.synced_at',
+                (tenant, list_id, date_updated, time.time())
+            )
+
+    def search(
+            self, tenant: str, query: str | None = None, *, list_id: str | None = None, status: str | None = None,
+            limit: int = 20
+    ) -> list[dict]:
+        """Tasks matching all the words of `query` (best matches first), or the most recently updated ones."""
+        conditions, params = ['tasks.tenant = ?'], [tenant]
+        if list_id:
+            conditions.append('tasks.list_id = ?')
+            params.append(list_id)
+        if status:
+            conditions.append('tasks.status = ? COLLATE NOCASE')
+            params.append(status)
+
+        if query and query.strip():
+            sql = (
+                'SELECT tasks.data FROM tasks_index JOIN tasks ON tasks.tenant = tasks_index.tenant '
+                'AND tasks.id = tasks_index.id WHERE tasks_index MATCH ? AND tasks_index.tenant = ? AND '
+                + ' AND '.join(conditions) + ' ORDER BY bm25(tasks_index) LIMIT ?'
+            )
+            params = [match_expression(query), tenant, *params, limit]
+        else:
+            sql = 'SELECT data FROM tasks WHERE ' + ' AND '.join(conditions) + ' ORDER BY date_updated DESC LIMIT ?'
+            params.append(limit)
+
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def lists(self, tenant: str) -> list[dict]:
+        """The mirrored lists of a tenant, with their number of tasks, latest update and last sync (epoch seconds)."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT lists.list_id, lists.date_updated, lists.synced_at, COUNT(tasks.id) AS tasks FROM lists '
+                'LEFT JOIN tasks ON tasks.tenant = lists.tenant AND tasks.list_id = lists.list_id '
+                'WHERE lists.tenant = ? GROUP BY lists.list_id', (tenant,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def add_webhook(
+            self, webhook_id: str, tenant: str, workspace_id: str, secret: str, events: typing.List[str]
+    ) -> None:
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO webhooks (id, tenant, workspace_id, secret, events) VALUES (?, ?, ?, ?, ?)',
+                (webhook_id, tenant, workspace_id, secret, json.dumps(events))
+            )
+
+    def webhook(self, webhook_id: str) -> dict | None:
+        """The tenant, workspace, secret and events of a registered webhook."""
+        with self._lock:
+            row = self._db.execute('SELECT * FROM webhooks WHERE id = ?', (webhook_id,)).fetchone()
+        return None if row is None else {**dict(row), 'events': json.loads(row['events'])}
+
+    def webhook_covers(self, tenant: str, workspace_id: str, events: typing.Iterable[str]) -> bool:
+        """Whether the webhooks of a tenant in a workspace are sent all of `events` (or every event)."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT events FROM webhooks WHERE tenant = ? AND workspace_id = ?', (tenant, workspace_id)
+            ).fetchall()
+        registered = {event for row in rows for event in json.loads(row['events'])}
+        return '*' in registered or bool(events) and registered.issuperset(events)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
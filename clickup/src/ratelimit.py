@@ -0,0 +1,89 @@
+import asyncio
+import random
+import time
+import typing
+
+
+def header_float(headers: typing.Mapping[str, str], name: str) -> float | None:
+    try:
+        return float(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Token bucket for a single API token, kept in step with ClickUp's X-RateLimit-* response headers.
+
+    Until the headers say otherwise the bucket holds `limit` tokens refilled evenly over `period` seconds.
+    Once ClickUp reports when its window resets, the bucket is refilled at that time instead.
+    Callers are served in the order they arrive.
+    """
+
+    def __init__(self, *, limit: int = 100, period: float = 60.0, max_backoff: float = 60.0):
+        self.limit = limit
+        self.period = period
+        self.max_backoff = max_backoff
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        # Monotonic time when ClickUp resets the window, if known.
+        self.reset_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.reset_at is None:
+            self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.limit / self.period)
+        elif now >= self.reset_at:
+            self.tokens = float(self.limit)
+            self.reset_at = None
+        self.updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                if self.reset_at is not None:
+                    delay = self.reset_at - now
+                else:
+                    delay = (1 - self.tokens) * self.period / self.limit
+                await asyncio.sleep(max(delay, 0.01))
+
+    def update(self, headers: typing.Mapping[str, str]) -> None:
+        """Adopt the limit, remaining requests and reset time reported by ClickUp."""
+        now = time.monotonic()
+        self._refill(now)
+
+        limit = header_float(headers, 'X-RateLimit-Limit')
+        if limit:
+            self.limit = int(limit)
+        reset = header_float(headers, 'X-RateLimit-Reset')
+        if reset is not None:
+            # An epoch timestamp (in seconds).
+            self.reset_at = now + max(0.0, reset - time.time())
+        remaining = header_float(headers, 'X-RateLimit-Remaining')
+        if remaining is not None:
+            # Requests still in flight aren't counted in `remaining` yet, so the lower figure wins.
+            self.tokens = min(self.tokens, remaining)
+
+    def backoff(self, headers: typing.Mapping[str, str], attempt: int) -> float:
+        """Hold back all callers after a 429, for Retry-After seconds if given, plus jitter.
+
+        Without Retry-After or X-RateLimit-Reset the delay grows exponentially with `attempt`.
+        Returns the delay.
+        """
+        now = time.monotonic()
+        delay = header_float(headers, 'Retry-After')
+        if delay is None:
+            reset = header_float(headers, 'X-RateLimit-Reset')
+            delay = reset - time.time() if reset is not None else 2 ** attempt
+        delay = min(self.max_backoff, max(0.0, delay))
+        delay += random.uniform(0, min(1.0, delay / 2) + 0.1)
+
+        self._refill(now)
+        self.tokens = 0.0
+        self.reset_at = now + delay
+        return delay
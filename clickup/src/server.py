@@ -1,20 +1,290 @@
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import json
+import math
+import os
+import tempfile
+import time
 import typing
 
 import pydantic
 from mcp.server.fastmcp import FastMCP, Context
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+from cache import TTLCache
+from fields import validate
+from mirror import TaskMirror, mirrored
 
 DEFAULT_PORT = 8000
 
+# Number of task pages requested ahead when fetching all pages, and the number of tasks in a page.
+PAGE_PREFETCH = 4
+PAGE_SIZE = 100
+
+# Workspace hierarchy snapshots, per API key and workspace.  Writes to a container drop the snapshots including it.
+HIERARCHY_TTL = float(os.environ.get('CLICKUP_HIERARCHY_TTL', 300))
+hierarchy_cache = TTLCache(maxsize=256, ttl=HIERARCHY_TTL)
+
+# Results of get_spaces, get_lists, get_tasks and get_custom_fields, per API key.  They are kept for longer when
+# ClickUp tells the server about the changes that affect them through a webhook registered with create_webhook.
+# The cache is bounded by the size of the results (as JSON) too, since get_tasks results can have thousands of tasks.
+READ_CACHE_TTL = float(os.environ.get('CLICKUP_READ_CACHE_TTL', 30))
+WEBHOOK_READ_CACHE_TTL = float(os.environ.get('CLICKUP_WEBHOOK_READ_CACHE_TTL', 3600))
+read_cache = TTLCache(
+    maxsize=1024, ttl=READ_CACHE_TTL, max_bytes=int(os.environ.get('CLICKUP_READ_CACHE_BYTES', 32 * 1024 * 1024))
+)
+# The webhook events that drop each kind of cached result.  A webhook of the workspace has to be sent all of them
+# for a result to be kept for WEBHOOK_READ_CACHE_TTL.
+SPACE_EVENTS = {'spaceCreated', 'spaceUpdated', 'spaceDeleted'}
+LIST_EVENTS = {
+    *SPACE_EVENTS, 'folderCreated', 'folderUpdated', 'folderDeleted', 'listCreated', 'listUpdated', 'listDeleted'
+}
+TASK_EVENTS = {
+    'listDeleted', 'taskCreated', 'taskUpdated', 'taskDeleted', 'taskMoved', 'taskPriorityUpdated',
+    'taskStatusUpdated', 'taskAssigneeUpdated', 'taskDueDateUpdated', 'taskTagUpdated'
+}
+# The workspace of each space, folder and list seen in a result, per API key, so that reads of a container know
+# which webhooks cover it.  Containers don't move between workspaces.
+container_workspaces = TTLCache(maxsize=16384, ttl=24 * 60 * 60)
+# Custom field definitions change rarely, and create_task checks custom field values against them.
+FIELDS_CACHE_TTL = float(os.environ.get('CLICKUP_FIELDS_CACHE_TTL', 600))
+
+# Tasks created at the same time by create_tasks, unless the caller asks for fewer.
+CREATE_TASKS_CONCURRENCY = int(os.environ.get('CLICKUP_CREATE_TASKS_CONCURRENCY', 8))
+
+# Local copy of the lists synced with sync_list, searched by search_tasks.
+task_mirror = TaskMirror(os.environ.get('CLICKUP_MIRROR', os.path.join(tempfile.gettempdir(), 'clickup-mirror.db')))
+
+
+def invalidate(tag: tuple) -> int:
+    """Drop the cached results tagged with `tag`, e.g. (tenant, 'list', list_id), returning how many were dropped."""
+    return hierarchy_cache.invalidate(tag) + read_cache.invalidate(tag)
+
+
+def event_tags(event: dict) -> list[tuple]:
+    """Tags (without the tenant) of the cached results that a webhook event may have made stale."""
+    name = event.get('event', '')
+    if name.startswith('task'):
+        return [('tasks',)]
+    if name.startswith('list'):
+        return [('lists',), ('list', str(event.get('list_id')))]
+    if name.startswith('folder'):
+        return [('lists',), ('folder', str(event.get('folder_id')))]
+    if name.startswith('space'):
+        return [('spaces',), ('lists',), ('space', str(event.get('space_id')))]
+    return []
+
+
+def mirror_event(tenant_key: str, event: dict) -> int:
+    """Apply a webhook event that a sync wouldn't notice to the task mirror, returning how many tasks it changed."""
+    name = event.get('event')
+    task_id = event.get('task_id')
+    if not task_id:
+        return 0
+    if name == 'taskDeleted':
+        return task_mirror.delete(tenant_key, str(task_id))
+    if name == 'taskMoved':
+        # The history item of a move has the list the task was moved to in `after`.
+        after = next(
+            (item['after'] for item in event.get('history_items', []) if isinstance(item.get('after'), dict)), {}
+        )
+        list_id = after.get('id')
+        return task_mirror.move(tenant_key, str(task_id), list_id and str(list_id), after.get('name'))
+    return 0
+
 
 class ClickupCustomField(pydantic.BaseModel):
     id: str
     value: str | int
 
 
+class ClickupTask(pydantic.BaseModel):
+    name: typing.Annotated[str, pydantic.Field(description='The name of the task')]
+    description: typing.Annotated[str | None, pydantic.Field(description='The description of the task')] = None
+    assignees: typing.Annotated[
+        typing.List[int] | None, pydantic.Field(description='The IDs of the users to assign to the task')] = None
+    tags: typing.Annotated[typing.List[str] | None, pydantic.Field(description='The tags to add to the task')] = None
+    status: typing.Annotated[str | None, pydantic.Field(description='The status of the task')] = None
+    priority: typing.Annotated[
+        typing.Literal[1, 2, 3, 4] | None, pydantic.Field(description='The priority of the task (1-4)')] = None
+    notify_all: typing.Annotated[bool, pydantic.Field(description='Whether to notify all assignees')] = False
+    parent: typing.Annotated[str | None, pydantic.Field(description='The ID of the parent task')] = None
+    custom_fields: typing.Annotated[
+        typing.List[ClickupCustomField] | None, pydantic.Field(description='The custom fields to set in this task')
+    ] = None
+
+    def data(self) -> typing.Dict[str, typing.Any]:
+        """The body of a create task request."""
+        data: typing.Dict[str, typing.Any] = {
+            'name': self.name,
+            'description': self.description,
+            'assignees': self.assignees,
+            'tags': self.tags,
+            'status': self.status,
+            'notify_all': self.notify_all,
+            'custom_fields': [cf.model_dump(mode="json") for cf in self.custom_fields] if self.custom_fields else []
+        }
+        if self.priority:
+            data['priority'] = self.priority
+        if self.parent:
+            data['parent'] = self.parent
+        return data
+
+
+class ClickupServer(FastMCP):
+
+    @contextlib.asynccontextmanager
+    async def process_lifespan(self):
+        """Process-wide resources.
+
+        The FastMCP lifespan runs once per MCP session, which is once per request in stateless mode,
+        so anything shared across requests is tied to the lifespan of the HTTP app instead.
+        """
+        from clickup import client_pool
+
+        try:
+            yield
+        finally:
+            await client_pool.aclose()
+            task_mirror.close()
+
+    def streamable_http_app(self):
+        app = super().streamable_http_app()
+        session_lifespan = app.router.lifespan_context
+
+        @contextlib.asynccontextmanager
+        async def lifespan(starlette_app):
+            async with self.process_lifespan(), session_lifespan(starlette_app) as state:
+                yield state
+
+        app.router.lifespan_context = lifespan
+        return app
+
+
 def make_server():
-    from clickup import ClickupClient
+    from clickup import ClickupClient, client_pool
+
+    def tenant(ctx: Context) -> str:
+        return client_pool.key(ClickupClient.api_key(ctx.request_context.request))
+
+    def invalidate_container(ctx: Context, container_type: str, container_id: str) -> None:
+        invalidate((tenant(ctx), container_type, container_id))
+
+    def remember_workspace(ctx: Context, workspace_id: str | None, containers: typing.Iterable[tuple]) -> None:
+        """Record the workspace of the (type, id) containers, if it is known."""
+        if workspace_id:
+            key = tenant(ctx)
+            for container in containers:
+                container_workspaces.set((key, *container), workspace_id)
+
+    def workspace_of(ctx: Context, container_type: str, container_id: str) -> str | None:
+        return container_workspaces.get((tenant(ctx), container_type, container_id))
+
+    async def cached(
+            ctx: Context, key: tuple, tags: typing.List[tuple], fetch: typing.Callable[[], typing.Awaitable],
+            ttl: float = None, *, workspace_id: str = None, events: typing.Collection[str] = ()
+    ) -> typing.Any:
+        """The cached result of a read for the caller's API key, or fetch() stored with the given tags.
+
+        Without an explicit `ttl`, the result is kept for longer if a webhook of its workspace is sent all of
+        `events`, the events that would drop it.
+        """
+        tenant_key = tenant(ctx)
+        cache_key = (tenant_key, *key)
+        result = read_cache.get(cache_key)
+        if result is not None:
+            return result
 
-    mcp = FastMCP('Clickup MCP Server', stateless_http=True, json_response=True, port=DEFAULT_PORT)
+        invalidations = read_cache.invalidations
+        result = await fetch()
+        # Something may have changed while the result was fetched.
+        if read_cache.invalidations == invalidations:
+            if ttl is None and workspace_id and task_mirror.webhook_covers(tenant_key, workspace_id, events):
+                ttl = WEBHOOK_READ_CACHE_TTL
+            if workspace_id:
+                tags = [*tags, ('team', workspace_id)]
+            read_cache.set(
+                cache_key, result, ttl=ttl, tags=[(tenant_key, *tag) for tag in tags], size=len(json.dumps(result))
+            )
+        return result
+
+    async def get_field_definitions(
+            ctx: Context, container_type: str, container_id: str, *, refresh: bool = False
+    ) -> dict:
+        # No webhook event covers custom fields and creating tasks doesn't change them, so only the TTL applies.
+        key = ('fields', container_type, container_id)
+        if refresh:
+            read_cache.pop((tenant(ctx), *key))
+        url = f'/{container_type}/{container_id}/field'
+        return await cached(
+            ctx, key, [], lambda: ClickupClient.api_get(ctx.request_context.request, url), ttl=FIELDS_CACHE_TTL
+        )
+
+    async def check_custom_fields(ctx: Context, list_id: str, data: dict) -> None:
+        """Fail before posting a task whose custom field values don't fit the (cached) definitions of its list.
+        The task is posted unchecked if the definitions can't be fetched."""
+        if not data.get('custom_fields'):
+            return
+        try:
+            definitions = (await get_field_definitions(ctx, 'list', list_id)).get('fields', [])
+            ids = {field.get('id') for field in definitions}
+            if any(custom_field.get('id') not in ids for custom_field in data['custom_fields']):
+                # The field may have been added since the definitions were cached.
+                definitions = (await get_field_definitions(ctx, 'list', list_id, refresh=True)).get('fields', [])
+        except Exception:  # noqa
+            # ClickUp still checks the values itself.
+            return
+        errors = validate(definitions, data['custom_fields'])
+        if errors:
+            raise ValueError('; '.join(errors))
+
+    async def sync(ctx: Context, list_id: str) -> int:
+        """Copy the tasks of a list updated since its last sync into the mirror, returning how many were copied."""
+        key = tenant(ctx)
+        date_updated = task_mirror.date_updated(key, list_id)
+        params = {'include_closed': True, 'subtasks': True, 'date_updated_gt': date_updated or None}
+        pages = ClickupClient.api_get_pages(
+            ctx.request_context.request, f'/list/{list_id}/task', params=params, prefetch=PAGE_PREFETCH,
+            key='tasks', transform=mirrored
+        )
+        count = 0
+        latest = date_updated or 0
+        async with contextlib.aclosing(pages):
+            async for result in pages:
+                tasks = result.get('tasks', [])
+                if not tasks:
+                    break
+                count += task_mirror.upsert(key, list_id, tasks)
+                latest = max(latest, *(int(task.get('date_updated') or 0) for task in tasks))
+
+        # Only once every page is stored, so that an interrupted sync is picked up where it left off.
+        task_mirror.synced(key, list_id, latest)
+        return count
+
+    async def get_space_hierarchy(ctx: Context, space: dict) -> dict:
+        request = ctx.request_context.request
+        folders, lists = await asyncio.gather(
+            ClickupClient.api_get(request, f'/space/{space["id"]}/folder'),
+            ClickupClient.api_get(request, f'/space/{space["id"]}/list'),
+        )
+        return {
+            'id': space['id'],
+            'name': space.get('name'),
+            'folders': [
+                {
+                    'id': folder['id'],
+                    'name': folder.get('name'),
+                    'lists': [{'id': lst['id'], 'name': lst.get('name')} for lst in folder.get('lists', [])]
+                }
+                for folder in folders.get('folders', [])
+            ],
+            'lists': [{'id': lst['id'], 'name': lst.get('name')} for lst in lists.get('lists', [])]
+        }
+
+    mcp = ClickupServer('Clickup MCP Server', stateless_http=True, json_response=True, port=DEFAULT_PORT)
 
     @mcp.tool()
     async def get_workspaces(
@@ -29,8 +299,52 @@ def make_server():
             ctx: Context,
             workspace_id: typing.Annotated[str, 'The parent workspace id']
     ):
-        """Get spaces from a ClickUp workspace. Returns space details including name, settings, and features."""
-        return await ClickupClient.api_get(ctx.request_context.request, f'/team/{workspace_id}/space')
+        """Get spaces from a ClickUp workspace. Returns space details including name, settings, and features.
+        The result may be cached for a short time (30 seconds by default),
+        or longer when a webhook reports the changes to the spaces."""
+
+        async def fetch():
+            result = await ClickupClient.api_get(ctx.request_context.request, f'/team/{workspace_id}/space')
+            remember_workspace(ctx, workspace_id, (('space', space['id']) for space in result.get('spaces', [])))
+            return result
+
+        return await cached(
+            ctx, ('spaces', workspace_id), [('spaces',)], fetch, workspace_id=workspace_id, events=SPACE_EVENTS
+        )
+
+    @mcp.tool()
+    async def get_hierarchy(
+            ctx: Context,
+            workspace_id: typing.Annotated[str, 'The workspace id'],
+            refresh: typing.Annotated[bool, 'Whether to ignore a previously cached hierarchy'] = False
+    ):
+        """Get the spaces, folders and lists of a ClickUp workspace in one call.
+        Returns the IDs and names of each container, with the lists of each folder and the folderless lists of each
+        space.  The result may be cached for a few minutes."""
+        key = (tenant(ctx), workspace_id)
+        if not refresh:
+            hierarchy = hierarchy_cache.get(key)
+            if hierarchy is not None:
+                return hierarchy
+
+        spaces = await ClickupClient.api_get(ctx.request_context.request, f'/team/{workspace_id}/space')
+        hierarchy = {
+            'id': workspace_id,
+            'spaces': await asyncio.gather(*(get_space_hierarchy(ctx, space) for space in spaces.get('spaces', [])))
+        }
+
+        containers = []
+        for space in hierarchy['spaces']:
+            containers.append(('space', space['id']))
+            containers.extend(('list', lst['id']) for lst in space['lists'])
+            for folder in space['folders']:
+                containers.append(('folder', folder['id']))
+                containers.extend(('list', lst['id']) for lst in folder['lists'])
+        remember_workspace(ctx, workspace_id, containers)
+        tags = [(key[0], 'team', workspace_id), (key[0], 'spaces'), (key[0], 'lists')]
+        tags.extend((key[0], *container) for container in containers)
+        hierarchy_cache.set(key, hierarchy, tags=tags)
+        return hierarchy
 
     @mcp.tool()
     async def get_lists(
@@ -39,9 +353,23 @@ def make_server():
             container_type: typing.Annotated[
                 typing.Literal['folder', 'space'], 'The type of container to get lists from'] = 'space'
     ):
-        """Get lists from a ClickUp folder or space. Returns list details including name and content."""
+        """Get lists from a ClickUp folder or space. Returns list details including name and content.
+        The result may be cached for a short time (30 seconds by default),
+        or longer when a webhook reports the changes to the lists."""
         url = f'/folder/{container_id}/list' if container_type == 'folder' else f'/space/{container_id}/list'
-        return await ClickupClient.api_get(ctx.request_context.request, url)
+        workspace_id = workspace_of(ctx, container_type, container_id)
+
+        async def fetch():
+            result = await ClickupClient.api_get(ctx.request_context.request, url)
+            containers = [('list', lst['id']) for lst in result.get('lists', [])]
+            containers.extend(('folder', lst['folder']['id']) for lst in result.get('lists', []) if lst.get('folder'))
+            remember_workspace(ctx, workspace_id, containers)
+            return result
+
+        return await cached(
+            ctx, ('lists', container_type, container_id), [(container_type, container_id), ('lists',)], fetch,
+            workspace_id=workspace_id, events=LIST_EVENTS
+        )
 
     @mcp.tool()
     async def get_tasks(
@@ -52,15 +380,118 @@ def make_server():
             page: typing.Annotated[int, 'The page number to get'] = 0,
             order_by: typing.Annotated[str, 'The field to order by'] = None,
             reverse: typing.Annotated[bool, 'Whether to reverse the order'] = False,
+            all_pages: typing.Annotated[bool, 'Whether to get all pages, starting from the page number'] = False,
+            max_tasks: typing.Annotated[int, 'The maximum number of tasks to get from all pages'] = None,
+            fields: typing.Annotated[
+                typing.List[str], 'Only return these fields of each task, e.g. name and status (id is always returned)'
+            ] = None,
     ):
-        """Get tasks from a ClickUp list. Returns task details including name, description, assignees, and status."""
-        return await ClickupClient.api_get(ctx.request_context.request, f'/list/{list_id}/task', params={
+        """Get tasks from a ClickUp list. Returns task details including name, description, assignees, and status.
+        A page has up to 100 tasks; set all_pages or max_tasks to get the following pages in the same call,
+        returned as one content block per page, each with its page number and whether it is the last page.
+        Tasks are large, so set fields to only get the fields needed.
+        The result may be cached for a short time (30 seconds by default),
+        or longer when a webhook reports the changes to the tasks."""
+        params = {
             'include_closed': include_closed,
             'subtasks': subtasks,
             'page': page,
             'order_by': order_by,
             'reverse': reverse
-        })
+        }
+        keys = ['id', *(field for field in fields if field != 'id')] if fields else None
+
+        def project(task: dict) -> dict:
+            return {key: task[key] for key in keys if key in task}
+
+        transform = project if keys else None
+
+        async def fetch():
+            if not all_pages and not max_tasks:
+                return await ClickupClient.api_get_items(
+                    ctx.request_context.request, f'/list/{list_id}/task', params=params,
+                    key='tasks', transform=transform
+                )
+
+            # One content block per page, so that the pages can be processed (and shown) one at a time.
+            results = []
+            remaining = max_tasks
+            pages = ClickupClient.api_get_pages(
+                ctx.request_context.request, f'/list/{list_id}/task', params=params, page=page,
+                prefetch=PAGE_PREFETCH, max_pages=math.ceil(max_tasks / PAGE_SIZE) if max_tasks else None,
+                key='tasks', transform=transform
+            )
+            number = page
+            async with contextlib.aclosing(pages):
+                async for result in pages:
+                    tasks = result.get('tasks', [])
+                    last_page = result.get('last_page', True) or not tasks
+                    if remaining is not None:
+                        if len(tasks) > remaining:
+                            tasks, last_page = tasks[:remaining], False
+                        remaining -= len(tasks)
+                    results.append({'page': number, 'tasks': tasks, 'last_page': last_page})
+                    if last_page or remaining == 0:
+                        break
+                    number += 1
+            return results
+
+        cache_key = (
+            'tasks', list_id, include_closed, subtasks, page, order_by, reverse, all_pages, max_tasks,
+            keys and tuple(keys)
+        )
+        return await cached(
+            ctx, cache_key, [('list', list_id), ('tasks',)], fetch,
+            workspace_id=workspace_of(ctx, 'list', list_id), events=TASK_EVENTS
+        )
+
+    @mcp.tool()
+    async def sync_list(
+            ctx: Context,
+            list_id: typing.Annotated[str, 'The ID of the list to copy'],
+    ):
+        """Copy the tasks of a ClickUp list into the local mirror searched by search_tasks, or update the copy.
+        Only tasks updated since the last sync are requested.  Returns the number of tasks copied and the lists in
+        the mirror."""
+        count = await sync(ctx, list_id)
+        return {'synced': count, 'lists': task_mirror.lists(tenant(ctx))}
+
+    @mcp.tool()
+    async def search_tasks(
+            ctx: Context,
+            query: typing.Annotated[str, 'Words to find in the name, description, tags or status of tasks'] = None,
+            list_id: typing.Annotated[str, 'Only search the tasks of this list'] = None,
+            status: typing.Annotated[str, 'Only return tasks with this status'] = None,
+            limit: typing.Annotated[int, 'The maximum number of tasks to return'] = 20,
+            max_age: typing.Annotated[
+                int, 'First sync the lists last synced more than this many seconds ago (by default none are synced)'
+            ] = None,
+    ):
+        """Search the tasks of the lists copied with sync_list, best matches first.
+        Without a query, returns the most recently updated tasks.
+        Returns the id, name, status, tags, assignees, due date and url of each task, and the errors of any sync."""
+        key = tenant(ctx)
+        errors = {}
+        if max_age is not None:
+            now = time.time()
+            list_ids = [
+                lst['list_id'] for lst in task_mirror.lists(key)
+                if (not list_id or lst['list_id'] == list_id) and now - lst['synced_at'] > max_age
+            ]
+
+            async def try_sync(lid: str) -> None:
+                try:
+                    await sync(ctx, lid)
+                except Exception as e:  # noqa
+                    # The list can still be searched as of its previous sync.
+                    errors[lid] = str(e) or type(e).__name__
+
+            await asyncio.gather(*(try_sync(lid) for lid in list_ids))
+
+        result = {'tasks': task_mirror.search(key, query, list_id=list_id, status=status, limit=limit)}
+        if errors:
+            result['sync_errors'] = errors
+        return result
 
     @mcp.tool()
     async def create_task(
@@ -79,21 +510,61 @@ def make_server():
     ):
         """Create a new task in a ClickUp list with specified properties
         like name, description, assignees, status, and dates."""
-        data: typing.Dict[str, typing.Any] = {
-            'name': name,
-            'description': description,
-            'assignees': assignees,
-            'tags': tags,
-            'status': status,
-            'notify_all': notify_all,
-            'custom_fields': [cf.model_dump(mode="json") for cf in custom_fields] if custom_fields else []
-        }
-        if priority:
-            data['priority'] = priority
-        if parent:
-            data['parent'] = parent
+        data = ClickupTask(
+            name=name,
+            description=description,
+            assignees=assignees,
+            tags=tags,
+            status=status,
+            priority=priority,
+            notify_all=notify_all,
+            parent=parent,
+            custom_fields=custom_fields
+        ).data()
+        await check_custom_fields(ctx, list_id, data)
+        result = await ClickupClient.api_post(ctx.request_context.request, f'/list/{list_id}/task', data=data)
+        invalidate_container(ctx, 'list', list_id)
+        return result
+
+    @mcp.tool()
+    async def create_tasks(
+            ctx: Context,
+            list_id: typing.Annotated[str, 'The ID of the list to create the tasks in'],
+            tasks: typing.Annotated[typing.List[ClickupTask], 'The tasks to create'],
+            indexes: typing.Annotated[
+                typing.List[int], 'Only create the tasks at these positions, e.g. the failed ones of a previous call'
+            ] = None,
+            concurrency: typing.Annotated[int, 'The maximum number of tasks created at the same time'] = None,
+    ):
+        """Create several tasks in a ClickUp list in one call.
+        Returns a result for each task created, in the order given, with either the created task or an error.
+        The positions of the tasks that failed are listed in 'failed' and can be passed back as indexes to retry them.
+        """
+        request = ctx.request_context.request
+        indexes = list(range(len(tasks))) if indexes is None else [i for i in indexes if 0 <= i < len(tasks)]
+        limit = asyncio.Semaphore(max(1, min(concurrency or CREATE_TASKS_CONCURRENCY, CREATE_TASKS_CONCURRENCY)))
+
+        async def create(index: int) -> dict:
+            async with limit:
+                try:
+                    data = tasks[index].data()
+                    await check_custom_fields(ctx, list_id, data)
+                    task = await ClickupClient.api_post(request, f'/list/{list_id}/task', data=data)
+                    result = {'index': index, 'task': task}
+                except Exception as e:  # noqa
+                    result = {'index': index, 'error': str(e) or type(e).__name__}
+            return result
+
+        if any(tasks[index].custom_fields for index in indexes):
+            # Fetched once up front rather than by every task at the same time.
+            with contextlib.suppress(Exception):
+                await get_field_definitions(ctx, 'list', list_id)
 
-        return await ClickupClient.api_post(ctx.request_context.request, f'/list/{list_id}/task', data=data)
+        try:
+            results = await asyncio.gather(*(create(index) for index in indexes))
+        finally:
+            invalidate_container(ctx, 'list', list_id)
+        return {'results': results, 'failed': [result['index'] for result in results if 'error' in result]}
 
     @mcp.tool()
     async def get_custom_fields(
@@ -105,15 +576,49 @@ def make_server():
     ):
         """Get the defined custom fields from a ClickUp folder, list, space or team/workspace.
         Returns details including id and name."""
-        match container_type:
-            case 'folder':
-                url = f'/folder/{container_id}/field'
-            case 'list':
-                url = f'/list/{container_id}/field'
-            case 'team':
-                url = f'/team/{container_id}/field'
-            case _:
-                url = f'/space/{container_id}/field'
-        return await ClickupClient.api_get(ctx.request_context.request, url)
+        return await get_field_definitions(ctx, container_type, container_id)
+
+    @mcp.tool()
+    async def create_webhook(
+            ctx: Context,
+            workspace_id: typing.Annotated[str, 'The workspace id'],
+            endpoint: typing.Annotated[
+                str, 'The URL to send events to, by default the webhooks URL of this server'] = None,
+            events: typing.Annotated[typing.List[str], 'The events to send, by default all of them'] = None,
+    ):
+        """Register a ClickUp webhook so that this server is told about changes in a workspace,
+        which lets it keep the results of get_spaces, get_lists and get_tasks in the workspace for longer.
+        Returns the webhook id, endpoint and events."""
+        request = ctx.request_context.request
+        endpoint = endpoint or str(request.base_url).rstrip('/') + '/webhooks'
+        result = await ClickupClient.api_post(
+            request, f'/team/{workspace_id}/webhook', data={'endpoint': endpoint, 'events': events or ['*']}
+        )
+        webhook = result.get('webhook', {})
+        webhook_id = str(result.get('id') or webhook.get('id'))
+        task_mirror.add_webhook(
+            webhook_id, tenant(ctx), workspace_id, webhook['secret'], webhook.get('events') or events or ['*']
+        )
+        return {'id': webhook_id, 'endpoint': webhook.get('endpoint', endpoint), 'events': webhook.get('events')}
+
+    @mcp.custom_route('/webhooks', methods=['POST'])
+    async def webhooks(request: Request) -> Response:
+        """Receives the events of webhooks registered with create_webhook, drops the cached results they affect and
+        removes deleted and moved tasks from the mirror."""
+        body = await request.body()
+        try:
+            event = json.loads(body)
+            registration = task_mirror.webhook(str(event['webhook_id']))
+        except (ValueError, KeyError, TypeError):
+            return JSONResponse({'error': 'Invalid event'}, status_code=400)
+
+        signature = request.headers.get('X-Signature', '')
+        if registration is None or not hmac.compare_digest(
+                hmac.new(registration['secret'].encode(), body, hashlib.sha256).hexdigest(), signature
+        ):
+            return JSONResponse({'error': 'Invalid signature'}, status_code=401)
+
+        invalidated = sum(invalidate((registration['tenant'], *tag)) for tag in event_tags(event))
+        return JSONResponse({'invalidated': invalidated, 'mirrored': mirror_event(registration['tenant'], event)})
 
     return mcp
@@ -1,4 +1,5 @@
 import base64
+import contextlib
 import json
 import logging
 import sys
@@ -28,6 +29,12 @@ class MockHttpxAsyncClient:
         res = await fetch(str(url), method='GET', **kwargs)
         return await self._response(res, method='GET', url=url)
 
+    @contextlib.asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        logger.info('%s (stream) -> %s, kwargs=%s', method, url, str(kwargs))
+        res = await fetch(str(url), method=method, **kwargs)
+        yield await self._response(res, method=method, url=url)
+
     @staticmethod
     def _btoa(text: str):
         return base64.b64encode(text.encode('latin1')).decode('ascii')
@@ -75,6 +82,7 @@ async def on_fetch(request, env, ctx):
     httpx_client = MockHttpxAsyncClient()
     httpx.AsyncClient.get = httpx_client.get
     httpx.AsyncClient.post = httpx_client.post
+    httpx.AsyncClient.stream = httpx_client.stream
 
     mcp = make_server()
     app = mcp.streamable_http_app()
@@ -1,5 +1,10 @@
 import httpx
 
+from ratelimit import header_float, rate_limiter
+
+# Times a request is retried after Discord answers 429 Too Many Requests.
+MAX_RETRIES = 3
+
 
 class DiscordClient(httpx.AsyncClient):
 
@@ -8,25 +13,44 @@ class DiscordClient(httpx.AsyncClient):
     def __init__(self, bot_token: str):
         super().__init__()
         self.bot_token = bot_token
+        self.rate_limiter = rate_limiter(bot_token)
+
+    async def api_request(self, method: str, route: str, major: str, url: str, **kwargs) -> httpx.Response:
+        """Make a request within the rate limits of `route` for the `major` parameter (channel/guild id).
+        A request that is rate limited anyway is retried after the time Discord asks for."""
+        headers = {'Authorization': f'Bot {self.bot_token}'}
+        attempt = 0
+        while True:
+            async with self.rate_limiter.limit(route, major) as bucket:
+                if method == 'POST':
+                    response = await self.post(url, headers=headers, **kwargs)
+                else:
+                    response = await self.get(url, headers=headers, **kwargs)
+                self.rate_limiter.update(route, major, bucket, response.headers)
+
+                if response.status_code != 429 or attempt >= MAX_RETRIES:
+                    return response
+
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = {}
+                retry_after = body.get('retry_after') or header_float(response.headers, 'Retry-After') or 1.0
+                is_global = bool(body.get('global')) or response.headers.get('X-RateLimit-Global') == 'true'
+                self.rate_limiter.rate_limited(bucket, float(retry_after), is_global=is_global)
+            attempt += 1
 
     async def get_server_info(self, server_id: str):
         url = f'{self.BASE_URL}/guilds/{server_id}'
 
-        headers = {
-            'Authorization': f'Bot {self.bot_token}'
-        }
-
-        response = await self.get(url, headers=headers)
+        response = await self.api_request('GET', 'GET /guilds/{guild_id}', server_id, url)
         response.raise_for_status()
         return response.json()
 
-    async def send_message(self, channel_id: str, content: str) -> None:
+    async def send_message(self, channel_id: str, content: str) -> dict:
         url = f'{self.BASE_URL}/channels/{channel_id}/messages'
-        headers = {
-            'Authorization': f'Bot {self.bot_token}',
-            'Content-Type': 'application/json'
-        }
         json = {'content': content}
 
-        response = httpx.post(url, headers=headers, json=json)
+        response = await self.api_request('POST', 'POST /channels/{channel_id}/messages', channel_id, url, json=json)
         response.raise_for_status()
+        return response.json()
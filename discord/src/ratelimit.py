@@ -0,0 +1,147 @@
+import asyncio
+import collections
+import contextlib
+import hashlib
+import time
+import typing
+
+# Discord allows each bot 50 requests per second across all routes.
+GLOBAL_LIMIT = 50
+
+# Bots with a limiter kept in memory.
+MAX_LIMITERS = 256
+
+
+def header_float(headers: typing.Mapping[str, str], name: str) -> float | None:
+    try:
+        return float(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class Bucket:
+    """A Discord rate limit bucket: how many requests remain until it resets."""
+
+    def __init__(self):
+        self.remaining: int | None = None
+        self.reset_at = 0.0
+        # Held while a request waits for its turn.  While the limits of the bucket aren't known (at first and after
+        # it resets), it is held until the response is handled, so that one request learns them alone.
+        self.lock = asyncio.Lock()
+
+    async def take(self) -> None:
+        """Wait until the bucket allows a request and count it (with the lock held)."""
+        delay = self.reset_at - time.monotonic()
+        if self.remaining == 0 and delay > 0:
+            await asyncio.sleep(delay)
+        if self.reset_at <= time.monotonic():
+            # The bucket has reset since its last response.
+            self.remaining = None
+        if self.remaining is not None:
+            self.remaining -= 1
+
+    def update(self, headers: typing.Mapping[str, str]) -> None:
+        remaining = header_float(headers, 'X-RateLimit-Remaining')
+        reset_after = header_float(headers, 'X-RateLimit-Reset-After')
+        if remaining is not None:
+            # Requests made since this one was sent are already counted.
+            self.remaining = int(remaining) if self.remaining is None else min(self.remaining, int(remaining))
+        if reset_after is not None:
+            self.reset_at = time.monotonic() + reset_after
+
+    def exhaust(self, retry_after: float) -> None:
+        self.remaining = 0
+        self.reset_at = time.monotonic() + retry_after
+
+
+class RateLimiter:
+    """Rate limits of one bot token.
+
+    Requests are grouped by route (e.g. 'POST /channels/{channel_id}/messages') and major parameter
+    (the channel, guild or webhook id in the route).  Routes that Discord reports (X-RateLimit-Bucket)
+    as sharing a bucket share it here too.  All requests also respect the global limit.
+    """
+
+    def __init__(self, *, global_limit: int = GLOBAL_LIMIT):
+        self.global_limit = global_limit
+        self.global_tokens = float(global_limit)
+        self.global_updated = time.monotonic()
+        # Until when everything waits after a global 429.
+        self.global_reset_at = 0.0
+        self._global_lock = asyncio.Lock()
+        # route -> bucket hash reported by Discord
+        self._routes: dict[str, str] = {}
+        self._buckets: dict[tuple[str, str], Bucket] = {}
+
+    def bucket(self, route: str, major: str) -> Bucket:
+        key = (self._routes.get(route, route), major)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = Bucket()
+        return bucket
+
+    async def _acquire_global(self) -> None:
+        async with self._global_lock:
+            while True:
+                now = time.monotonic()
+                if now < self.global_reset_at:
+                    await asyncio.sleep(self.global_reset_at - now)
+                    continue
+
+                self.global_tokens = min(
+                    self.global_limit, self.global_tokens + (now - self.global_updated) * self.global_limit
+                )
+                self.global_updated = now
+                if self.global_tokens >= 1:
+                    self.global_tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.global_tokens) / self.global_limit)
+
+    @contextlib.asynccontextmanager
+    async def limit(self, route: str, major: str) -> typing.AsyncIterator[Bucket]:
+        """Wait for a request of the route to be allowed.
+        The bucket is held until the response is handled only while its limits aren't known."""
+        bucket = self.bucket(route, major)
+        await bucket.lock.acquire()
+        held = True
+        try:
+            await bucket.take()
+            if bucket.remaining is not None:
+                bucket.lock.release()
+                held = False
+            await self._acquire_global()
+            yield bucket
+        finally:
+            if held:
+                bucket.lock.release()
+
+    def update(self, route: str, major: str, bucket: Bucket, headers: typing.Mapping[str, str]) -> None:
+        """Adopt the rate limit headers of a response to a request made within limit(route, major)."""
+        bucket.update(headers)
+        bucket_hash = headers.get('X-RateLimit-Bucket')
+        if bucket_hash and self._routes.get(route) != bucket_hash:
+            self._routes[route] = bucket_hash
+            # Later requests of the route use the shared bucket, starting from what this response said.
+            self._buckets.setdefault((bucket_hash, major), bucket)
+
+    def rate_limited(self, bucket: Bucket, retry_after: float, *, is_global: bool) -> None:
+        """Hold back the requests affected by a 429 response for `retry_after` seconds."""
+        if is_global:
+            self.global_reset_at = time.monotonic() + retry_after
+        else:
+            bucket.exhaust(retry_after)
+
+
+limiters: collections.OrderedDict[str, RateLimiter] = collections.OrderedDict()
+
+
+def rate_limiter(bot_token: str) -> RateLimiter:
+    """The limiter of a bot token, shared by every client using the token."""
+    key = hashlib.sha256(bot_token.encode()).hexdigest()
+    limiter = limiters.get(key)
+    if limiter is None:
+        limiter = limiters[key] = RateLimiter()
+        while len(limiters) > MAX_LIMITERS:
+            limiters.popitem(last=False)
+    limiters.move_to_end(key)
+    return limiter
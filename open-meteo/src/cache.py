@@ -0,0 +1,60 @@
+import collections
+import time
+import typing
+
+
+def next_update(interval: float, now: float | None = None) -> float:
+    """The (epoch) time of the next model update, for models updated every `interval` seconds."""
+    now = time.time() if now is None else now
+    return (now // interval + 1) * interval
+
+
+def snap(latitude: float, longitude: float, resolution: float) -> tuple[float, float]:
+    """Snap coordinates to the center of their tile on a grid of the given resolution (in degrees)."""
+    return round(round(latitude / resolution) * resolution, 4), round(round(longitude / resolution) * resolution, 4)
+
+
+class TileCache:
+    """LRU cache of parsed responses, bounded by the size of the response bodies.
+
+    Each entry expires at an absolute time (the next model update) instead of after a fixed TTL.
+    """
+
+    def __init__(self, *, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: collections.OrderedDict[str, tuple[float, int, typing.Any]] = collections.OrderedDict()
+
+    def get(self, key: str) -> typing.Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires, _, value = entry
+        if expires <= time.time():
+            self.pop(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: typing.Any, *, size: int, expires: float) -> None:
+        self.pop(key)
+        if size > self.max_bytes:
+            return
+
+        self._entries[key] = (expires, size, value)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self.size -= evicted
+
+    def pop(self, key: str) -> typing.Any:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self.size -= entry[1]
+        return entry[2]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,120 @@
+import datetime
+import os
+import re
+
+import numpy as np
+
+# Variable names end up in file names, so only plain Open-Meteo variable names are accepted.
+VARIABLE_PATTERN = re.compile(r'^[a-z0-9_]+$')
+
+DAYS_PER_YEAR = 366
+
+
+def day_range(start: datetime.date, end: datetime.date) -> np.ndarray:
+    return np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+
+
+def runs(missing: np.ndarray) -> list[tuple[int, int]]:
+    """(first, last) indexes of each run of True values."""
+    padded = np.concatenate(([False], missing, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return [(int(first), int(last) - 1) for first, last in zip(edges[::2], edges[1::2])]
+
+
+def summarize(values: np.ndarray) -> dict[str, float | None]:
+    """Min, max and mean of the non-missing values."""
+    present = values[~np.isnan(values)]
+    if not present.size:
+        return {'min': None, 'max': None, 'mean': None}
+    return {'min': float(present.min()), 'max': float(present.max()), 'mean': float(present.mean())}
+
+
+class HistoryCache:
+    """On-disk columnar cache of daily historical values.
+
+    Each location tile, year and variable is stored as a memory-mapped .npy column of 366 days,
+    next to a mask of the days that have already been downloaded.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _column(self, tile: tuple[float, float], year: int, variable: str) -> tuple[np.memmap, np.memmap]:
+        if not VARIABLE_PATTERN.match(variable):
+            raise ValueError(f'Invalid variable: {variable}')
+
+        directory = os.path.join(self.root, f'{tile[0]}_{tile[1]}', str(year))
+        values_path = os.path.join(directory, f'{variable}.npy')
+        mask_path = os.path.join(directory, f'{variable}.mask.npy')
+        if not os.path.exists(mask_path):
+            os.makedirs(directory, exist_ok=True)
+            values = np.lib.format.open_memmap(values_path, mode='w+', dtype=np.float64, shape=(DAYS_PER_YEAR,))
+            values[:] = np.nan
+            values.flush()
+            mask = np.lib.format.open_memmap(mask_path, mode='w+', dtype=np.bool_, shape=(DAYS_PER_YEAR,))
+            mask.flush()
+        return np.load(values_path, mmap_mode='r+'), np.load(mask_path, mmap_mode='r+')
+
+    @staticmethod
+    def _years(start: datetime.date, end: datetime.date):
+        """(year, first day index, last day index) for each year between start and end."""
+        for year in range(start.year, end.year + 1):
+            first = start if year == start.year else datetime.date(year, 1, 1)
+            last = end if year == end.year else datetime.date(year, 12, 31)
+            yield year, first.timetuple().tm_yday - 1, last.timetuple().tm_yday - 1
+
+    def missing(
+            self, tile: tuple[float, float], start: datetime.date, end: datetime.date, variables: list[str]
+    ) -> list[tuple[datetime.date, datetime.date]]:
+        """Contiguous date ranges (at most a year each) where any of the variables hasn't been downloaded."""
+        result = []
+        for year, first, last in self._years(start, end):
+            downloaded = np.ones(last - first + 1, dtype=np.bool_)
+            for variable in variables:
+                _, mask = self._column(tile, year, variable)
+                downloaded &= mask[first:last + 1]
+
+            jan1 = datetime.date(year, 1, 1)
+            for run_first, run_last in runs(~downloaded):
+                result.append((
+                    jan1 + datetime.timedelta(days=first + run_first),
+                    jan1 + datetime.timedelta(days=first + run_last)
+                ))
+        return result
+
+    def write(self, tile: tuple[float, float], daily: dict, variables: list[str], *, until: datetime.date) -> None:
+        """Store the daily values of an archive response, only marking days up to `until` as downloaded."""
+        days = np.array(daily.get('time', []), dtype='datetime64[D]')
+        days = days[days <= np.datetime64(until, 'D')]
+        if not days.size:
+            return
+
+        years = days.astype('datetime64[Y]')
+        day_of_year = (days - years).astype(np.int64)
+        years = years.astype(np.int64) + 1970
+        for variable in variables:
+            data = np.array(
+                [np.nan if value is None else value for value in daily.get(variable, [])[:days.size]], dtype=np.float64
+            )
+            if data.size != days.size:
+                continue
+            for year in np.unique(years):
+                selected = years == year
+                values, mask = self._column(tile, int(year), variable)
+                values[day_of_year[selected]] = data[selected]
+                mask[day_of_year[selected]] = True
+                values.flush()
+                mask.flush()
+
+    def read(
+            self, tile: tuple[float, float], start: datetime.date, end: datetime.date, variables: list[str]
+    ) -> dict[str, np.ndarray]:
+        """Contiguous arrays of the cached values of each variable from start to end (NaN where missing)."""
+        result = {}
+        for variable in variables:
+            parts = []
+            for year, first, last in self._years(start, end):
+                values, _ = self._column(tile, year, variable)
+                parts.append(np.array(values[first:last + 1]))
+            result[variable] = np.concatenate(parts) if parts else np.array([], dtype=np.float64)
+        return result
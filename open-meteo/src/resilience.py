@@ -0,0 +1,43 @@
+import time
+
+
+class CircuitBreaker:
+    """Stops sending requests to a failing upstream for a cool-down period.
+
+    The circuit opens after `threshold` consecutive failures.  Once the cool-down has passed a single
+    trial request is let through: success closes the circuit again, failure restarts the cool-down.
+    """
+
+    def __init__(self, *, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        # When the current trial request started; a trial that never reports back expires after the cool-down.
+        self._trial_at: float | None = None
+
+    @property
+    def open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.cooldown:
+            return False
+        if self._trial_at is not None and now - self._trial_at < self.cooldown:
+            return False
+        self._trial_at = now
+        return True
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self._trial_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._trial_at = None
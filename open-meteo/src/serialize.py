@@ -0,0 +1,19 @@
+import json
+import typing
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, e.g. it isn't available in Cloudflare Python workers.
+    orjson = None
+
+
+def dumps(obj: typing.Any) -> str:
+    """Serialize to compact JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+def project(data: dict[str, typing.Any], keys: typing.Iterable[str]) -> dict[str, typing.Any]:
+    """Only the given top-level keys of a response, leaving out the metadata that wasn't asked for."""
+    return {key: data[key] for key in keys if key in data}
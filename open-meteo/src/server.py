@@ -1,63 +1,350 @@
+import asyncio
+import contextlib
+import datetime
 import json
 import logging
+import math
+import os
+import tempfile
+import time
 import typing
+from urllib.parse import urlparse
 
 import httpx
+import numpy as np
+import pydantic
 from mcp.server.fastmcp import FastMCP
 
+from cache import TileCache, next_update, snap
+from history import HistoryCache, day_range, summarize
+from pool import ClientPool
+from resilience import CircuitBreaker
+from serialize import dumps, project
 
 # Constants
 OPEN_METEO_API_BASE = 'https://api.open-meteo.com/v1'
+ARCHIVE_API_BASE = 'https://archive-api.open-meteo.com/v1'
 USER_AGENT = 'weather/1.0 (jotsu.com, getjotsu@gmail.com)'
 
 UNITS = 'temperature_unit=fahrenheit&wind_speed_unit=mph&precipitation_unit=inch'
 
+CURRENT = 'temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code'
+DAILY = 'temperature_2m_max,temperature_2m_min,precipitation_sum,weather_code'
 
-async def make_open_meteo_request(url: str) -> dict[str, typing.Any] | None:
-    """Make requests to the Open Meteo API."""
+# What the compact output keeps of a current weather response.
+CURRENT_KEYS = ('latitude', 'longitude', 'current_units', 'current', 'age_seconds')
+
+# Open-Meteo accepts comma-separated coordinate lists; this keeps the request URLs a reasonable length.
+MAX_LOCATIONS_PER_REQUEST = 100
+# Maximum number of concurrent upstream requests made by a single batch tool call.
+BATCH_CONCURRENCY = 4
+
+# Nearby coordinates get the same model output, so requests are made for (and cached by) the center of
+# their tile on a grid close to the model resolution.  Cached data expires when the models next update:
+# current conditions every 15 minutes and the forecast models hourly.
+GRID_RESOLUTION = 0.05
+CURRENT_UPDATE_INTERVAL = 15 * 60
+FORECAST_UPDATE_INTERVAL = 60 * 60
+
+tile_cache = TileCache(max_bytes=int(os.environ.get('OPEN_METEO_CACHE_BYTES', 32 * 1024 * 1024)))
+
+# The last good response for each URL is kept after it expires.  For a few minutes it is served right away
+# while it is revalidated in the background; if Open-Meteo is failing it is served for up to a day.
+# Stale data is marked with its age (in seconds) as `age_seconds`.
+STALE_WHILE_REVALIDATE = 5 * 60
+STALE_IF_ERROR = 24 * 60 * 60
+
+# This is a separate budget from the tile cache: entries evicted from one can still be held by the other.
+last_good = TileCache(max_bytes=int(os.environ.get('OPEN_METEO_STALE_CACHE_BYTES', 16 * 1024 * 1024)))
+revalidating: dict[str, asyncio.Task] = {}
+
+# After repeated failures, requests to that host are skipped for a cool-down period.
+breakers: dict[str, CircuitBreaker] = {}
+
+# Historical data is downloaded in chunks of at most a year and kept in an on-disk columnar cache.
+# The most recent days of the archive may still be revised, so they are not cached.
+ARCHIVE_START = datetime.date(1940, 1, 1)
+ARCHIVE_REVISION_DAYS = 7
+HISTORY_RESOLUTION = 0.1
+DEFAULT_HISTORY_VARIABLES = ['temperature_2m_max', 'temperature_2m_min', 'precipitation_sum']
+
+history_cache = HistoryCache(
+    os.environ.get('OPEN_METEO_HISTORY_CACHE', os.path.join(tempfile.gettempdir(), 'open-meteo-history'))
+)
+
+# Shared by every tool call in the process and closed when the server shuts down.
+client_pool = ClientPool()
+
+
+async def fetch_open_meteo(url: str) -> tuple[typing.Any, int] | None:
+    """Fetch a URL from the Open Meteo API, returning the parsed data and the size of the response body."""
     headers = {
         'User-Agent': USER_AGENT,
         'Accept': 'application/json'
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, timeout=30.0)
-            if response.status_code != 200:
-                logging.error(json.dumps(dict(response.headers)))
-                logging.error(response.text)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:  # noqa
-            logging.error(e)
-            return None
+    host = urlparse(url).netloc
+    breaker = breakers.setdefault(host, CircuitBreaker())
+    if not breaker.allow():
+        logging.warning('Circuit open for %s, skipping request.', host)
+        return None
+
+    try:
+        response = await client_pool.client.get(url, headers=headers, timeout=30.0)
+        if response.status_code != 200:
+            logging.error(json.dumps(dict(response.headers)))
+            logging.error(response.text)
+        # Client errors are our problem, not a sign of a failing upstream.
+        if response.status_code >= 500:
+            breaker.failure()
+        else:
+            breaker.success()
+        response.raise_for_status()
+        return response.json(), len(response.content)
+    except Exception as e:  # noqa
+        if not isinstance(e, httpx.HTTPStatusError):
+            breaker.failure()
+        logging.error(e)
+        return None
+
+
+def store(url: str, data: typing.Any, *, size: int, update_interval: float) -> None:
+    """Cache a response until the next model update, and keep it as the last good value after that."""
+    expires = next_update(update_interval)
+    tile_cache.set(url, data, size=size, expires=expires)
+    last_good.set(url, (time.time(), expires, data), size=size, expires=expires + STALE_IF_ERROR)
+
+
+def stale(entry: tuple[float, float, typing.Any]) -> typing.Any:
+    """A stale value, marked with its age."""
+    fetched, _, data = entry
+    age = int(time.time() - fetched)
+    return {**data, 'age_seconds': age} if isinstance(data, dict) else data
+
+
+async def refresh(url: str, update_interval: float) -> dict[str, typing.Any] | None:
+    result = await fetch_open_meteo(url)
+    if result is None:
+        return None
+
+    data, size = result
+    store(url, data, size=size, update_interval=update_interval)
+    return data
+
+
+def revalidate(url: str, update_interval: float) -> None:
+    """Refresh a URL in the background, at most once at a time."""
+    if url not in revalidating:
+        task = asyncio.create_task(refresh(url, update_interval))
+        revalidating[url] = task
+        task.add_done_callback(lambda _: revalidating.pop(url, None))
+
+
+async def make_open_meteo_request(url: str, update_interval: float | None = None) -> dict[str, typing.Any] | None:
+    """Make requests to the Open Meteo API.
+
+    With an update interval, the response is cached until the next model update.  After that the
+    last good response is served (marked with its age) while it is revalidated, or when the request fails.
+    The returned data is shared and must not be modified.
+    """
+    if not update_interval:
+        result = await fetch_open_meteo(url)
+        return result[0] if result else None
+
+    data = tile_cache.get(url)
+    if data is not None:
+        return data
+
+    entry = last_good.get(url)
+    if entry is not None and time.time() - entry[1] <= STALE_WHILE_REVALIDATE:
+        revalidate(url, update_interval)
+        return stale(entry)
+
+    data = await refresh(url, update_interval)
+    if data is None and entry is not None:
+        return stale(entry)
+    return data
+
+
+def current_url(latitude: float | str, longitude: float | str) -> str:
+    return f'{OPEN_METEO_API_BASE}/forecast?latitude={latitude}&longitude={longitude}&{UNITS}&current={CURRENT}'
+
+
+def forecast_url(latitude: float | str, longitude: float | str) -> str:
+    return f'{OPEN_METEO_API_BASE}/forecast?latitude={latitude}&longitude={longitude}&{UNITS}&daily={DAILY}&timezone=auto'  # noqa
+
+
+def history_url(
+        latitude: float, longitude: float, start: datetime.date, end: datetime.date, variables: list[str]
+) -> str:
+    daily = ','.join(variables)
+    return f'{ARCHIVE_API_BASE}/archive?latitude={latitude}&longitude={longitude}&start_date={start}&end_date={end}&{UNITS}&daily={daily}&timezone=UTC'  # noqa
+
+
+class Location(pydantic.BaseModel):
+    latitude: float
+    longitude: float
+
+
+async def gather_bounded(aws: typing.Iterable[typing.Awaitable], limit: int) -> list:
+    """Like asyncio.gather, but with at most `limit` awaitables running at once."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in aws))
+
+
+async def make_open_meteo_batch_request(
+        url: typing.Callable[[typing.Any, typing.Any], str],
+        locations: typing.List[Location],
+        update_interval: float
+) -> list[dict[str, typing.Any] | None]:
+    """Fetch data for many locations, with up to MAX_LOCATIONS_PER_REQUEST coordinates per upstream request.
+
+    Each location's tile is looked up in (and stored to) the cache individually, so only uncached tiles are fetched.
+    Results are in the same order as the locations, None where a request failed.
+    """
+    tiles = [snap(location.latitude, location.longitude, GRID_RESOLUTION) for location in locations]
+    results = {tile: tile_cache.get(url(*tile)) for tile in tiles}
+    missing = [tile for tile, data in results.items() if data is None]
+
+    async def fetch(chunk: list[tuple[float, float]]):
+        latitudes = ','.join(str(latitude) for latitude, _ in chunk)
+        longitudes = ','.join(str(longitude) for _, longitude in chunk)
+        result = await fetch_open_meteo(url(latitudes, longitudes))
+        if result is None:
+            # Fall back to the last good values, if there are any.
+            for tile in chunk:
+                entry = last_good.get(url(*tile))
+                results[tile] = stale(entry) if entry is not None else None
+            return
+
+        data, size = result
+        # A single coordinate returns an object, multiple coordinates return a list.
+        items = data if isinstance(data, list) else [data]
+        for tile, item in zip(chunk, items):
+            results[tile] = item
+            store(url(*tile), item, size=size // len(items), update_interval=update_interval)
+
+    chunks = [missing[i:i + MAX_LOCATIONS_PER_REQUEST] for i in range(0, len(missing), MAX_LOCATIONS_PER_REQUEST)]
+    await gather_bounded((fetch(chunk) for chunk in chunks), BATCH_CONCURRENCY)
+    return [results[tile] for tile in tiles]
+
+
+def format_forecast(data: dict) -> str:
+    """Format the daily forecast into a readable string."""
+    daily = data.get('daily', {})
+    days = zip(
+        daily.get('time', []), daily.get('temperature_2m_max', []),
+        daily.get('temperature_2m_min', []), daily.get('precipitation_sum', [])
+    )
+
+    forecast = '\n---\n'.join(
+        f"""Date: {date}
+Max Temperature: {temperature_max}°F
+Min Temperature: {temperature_min}°F
+Precipitation: {precipitation} in"""
+        for date, temperature_max, temperature_min, precipitation in days
+    )
+    if 'age_seconds' in data:
+        forecast = f'(Forecast retrieved {data["age_seconds"] // 60} minutes ago)\n{forecast}'
+    return forecast
+
+
+class HistoryStatistics(pydantic.BaseModel):
+    min: float | None = None
+    max: float | None = None
+    mean: float | None = None
+
+
+class History(pydantic.BaseModel):
+    latitude: float
+    longitude: float
+    time: list[str]
+    daily: dict[str, list[float | None]]
+    summary: dict[str, HistoryStatistics]
 
 
 DEFAULT_PORT = 8000
 
 
+class OpenMeteoServer(FastMCP):
+
+    @contextlib.asynccontextmanager
+    async def process_lifespan(self):
+        """Process-wide resources.
+
+        The FastMCP lifespan runs once per MCP session, which is once per request in stateless mode,
+        so anything shared across requests is tied to the lifespan of the HTTP app instead.
+        """
+        try:
+            yield
+        finally:
+            await client_pool.aclose()
+
+    def streamable_http_app(self):
+        app = super().streamable_http_app()
+        session_lifespan = app.router.lifespan_context
+
+        @contextlib.asynccontextmanager
+        async def lifespan(starlette_app):
+            async with self.process_lifespan(), session_lifespan(starlette_app) as state:
+                yield state
+
+        app.router.lifespan_context = lifespan
+        return app
+
+
 def setup_server():
-    mcp = FastMCP('Open Meteo MCP Server', stateless_http=True, port=DEFAULT_PORT)
+    mcp = OpenMeteoServer('Open Meteo MCP Server', stateless_http=True, port=DEFAULT_PORT)
 
-    @mcp.tool()
-    async def get_current_weather(latitude: float, longitude: float) -> str:
+    # The JSON text is the whole result, so it isn't duplicated as structured content.
+    @mcp.tool(structured_output=False)
+    async def get_current_weather(latitude: float, longitude: float, compact: bool = False) -> str:
         """Get current weather for a location.
           Args:
             latitude: Latitude of the location
             longitude: Longitude of the location
+            compact: Return minified JSON with only the location and current weather
 
         Returns:
             str: JSON string with current weather data
         """
-        current = 'temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code'
-        url = f'{OPEN_METEO_API_BASE}/forecast?latitude={latitude}&longitude={longitude}&{UNITS}&current={current}'
-        data = await make_open_meteo_request(url)
+        tile = snap(latitude, longitude, GRID_RESOLUTION)
+        data = await make_open_meteo_request(current_url(*tile), CURRENT_UPDATE_INTERVAL)
 
         if not data:
             return 'Unable to fetch weather data.'
 
+        if compact:
+            return dumps(project(data, CURRENT_KEYS))
         return json.dumps(data, indent=2)
 
+    @mcp.tool(structured_output=False)
+    async def get_current_weather_batch(locations: typing.List[Location], compact: bool = False) -> str:
+        """Get current weather for several locations at once.
+          Args:
+            locations: The latitude and longitude of each location
+            compact: Return minified JSON with only the location and current weather
+
+        Returns:
+            str: JSON string with a list of current weather data, in the same order as the locations
+        """
+        results = await make_open_meteo_batch_request(current_url, locations, CURRENT_UPDATE_INTERVAL)
+        error = 'Unable to fetch weather data.'
+        items = [
+            (project(data, CURRENT_KEYS) if compact else data) if data
+            else {'latitude': location.latitude, 'longitude': location.longitude, 'error': error}
+            for location, data in zip(locations, results)
+        ]
+
+        if compact:
+            return dumps(items)
+        return json.dumps(items, indent=2)
+
     @mcp.tool()
     async def get_forecast(latitude: float, longitude: float) -> str:
         """Get weather forecast for a location.
@@ -68,24 +355,91 @@ def setup_server():
         Returns:
             str: Formatted weather forecast
         """
-        daily = 'temperature_2m_max,temperature_2m_min,precipitation_sum,weather_code'
-        url = f'{OPEN_METEO_API_BASE}/forecast?latitude={latitude}&longitude={longitude}&{UNITS}&daily={daily}&timezone=auto'  # noqa
-        data = await make_open_meteo_request(url)
+        tile = snap(latitude, longitude, GRID_RESOLUTION)
+        data = await make_open_meteo_request(forecast_url(*tile), FORECAST_UPDATE_INTERVAL)
 
         if not data:
             return 'Unable to fetch forecast data.'
 
-        # Format the data for readability
-        daily = data.get('daily', {})
+        return format_forecast(data)
+
+    @mcp.tool()
+    async def get_forecast_batch(locations: typing.List[Location]) -> str:
+        """Get weather forecasts for several locations at once.
+        Args:
+            locations: The latitude and longitude of each location
+
+        Returns:
+            str: Formatted weather forecasts, in the same order as the locations
+        """
+        results = await make_open_meteo_batch_request(forecast_url, locations, FORECAST_UPDATE_INTERVAL)
         forecasts = []
+        for location, data in zip(locations, results):
+            forecast = format_forecast(data) if data else 'Unable to fetch forecast data.'
+            forecasts.append(f'Location: {location.latitude}, {location.longitude}\n{forecast}')
+
+        return '\n===\n'.join(forecasts)
+
+    @mcp.tool()
+    async def get_history(
+            latitude: float,
+            longitude: float,
+            start: str,
+            end: str,
+            variables: typing.List[str] | None = None
+    ) -> str | History:
+        """Get historical daily weather for a location, from 1940 until a few days ago.
+        Args:
+            latitude: Latitude of the location
+            longitude: Longitude of the location
+            start: First day (YYYY-MM-DD)
+            end: Last day (YYYY-MM-DD)
+            variables: Open-Meteo daily variables (e.g. temperature_2m_max, precipitation_sum)
+
+        Returns:
+            Daily values in °F, mph and inches, with their min/max/mean
+        """
+        start_date = max(datetime.date.fromisoformat(start), ARCHIVE_START)
+        end_date = min(datetime.date.fromisoformat(end), datetime.date.today())
+        if start_date > end_date:
+            raise ValueError(f'Invalid date range: {start} - {end}')
+
+        variables = variables or DEFAULT_HISTORY_VARIABLES
+        tile = snap(latitude, longitude, HISTORY_RESOLUTION)
+        cacheable_until = datetime.date.today() - datetime.timedelta(days=ARCHIVE_REVISION_DAYS)
+
+        # Only the days that aren't cached yet are downloaded, a chunk (at most a year) per request.
+        chunks = history_cache.missing(tile, start_date, end_date, variables)
+        responses = await gather_bounded(
+            (make_open_meteo_request(history_url(*tile, first, last, variables)) for first, last in chunks),
+            BATCH_CONCURRENCY
+        )
+        if any(data is None for data in responses):
+            return 'Unable to fetch historical weather data.'
+
+        arrays = history_cache.read(tile, start_date, end_date, variables)
+        for data in responses:
+            daily = data.get('daily', {})
+            history_cache.write(tile, daily, variables, until=cacheable_until)
 
-        for i in range(len(daily.get('time', []))):
-            forecast = f"""Date: {daily['time'][i]}
-Max Temperature: {daily['temperature_2m_max'][i]}°F
-Min Temperature: {daily['temperature_2m_min'][i]}°F
-Precipitation: {daily['precipitation_sum'][i]} in"""
-            forecasts.append(forecast)
+            # Recent days aren't cached, so the downloaded values are always copied in directly.
+            days = np.array(daily.get('time', []), dtype='datetime64[D]')
+            positions = (days - np.datetime64(start_date, 'D')).astype(np.int64)
+            for variable in variables:
+                values = daily.get(variable, [])
+                if len(values) == len(positions):
+                    arrays[variable][positions] = [np.nan if value is None else value for value in values]
 
-        return '\n---\n'.join(forecasts)
+        days = day_range(start_date, end_date)
+        return History(
+            latitude=tile[0],
+            longitude=tile[1],
+            time=[str(day) for day in days],
+            daily={
+                variable: [None if math.isnan(value) else value for value in values.tolist()]
+                for variable, values in arrays.items()
+            },
+            summary={variable: HistoryStatistics(**summarize(values)) for variable, values in arrays.items()}
+        )
 
     return mcp
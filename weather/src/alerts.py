@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+import typing
+
+from spatial import SpatialIndex
+
+logger = logging.getLogger(__name__)
+
+
+class AlertsSnapshot:
+    """An immutable index of active alert features by state, zone (UGC code) and severity."""
+
+    def __init__(self, features: list[dict], *, source: typing.Any = None):
+        self.source = source
+        self.features = features
+        self.created = time.monotonic()
+        self.by_state: dict[str, list[dict]] = {}
+        self.by_zone: dict[str, list[dict]] = {}
+        self.by_severity: dict[str, list[dict]] = {}
+        self.order = {id(feature): i for i, feature in enumerate(features)}
+        self.spatial = SpatialIndex(features)
+
+        for feature in features:
+            props = feature.get('properties') or {}
+            zones = props.get('geocode', {}).get('UGC') or []
+            # UGC codes start with the state (or marine area) code, e.g. NYZ072 or ANZ338.
+            for state in dict.fromkeys(zone[:2] for zone in zones):
+                self.by_state.setdefault(state, []).append(feature)
+            for zone in dict.fromkeys(zones):
+                self.by_zone.setdefault(zone, []).append(feature)
+            self.by_severity.setdefault(props.get('severity') or 'Unknown', []).append(feature)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+    def alerts(
+            self, *,
+            state: str | None = None,
+            zone: str | None = None,
+            severity: str | None = None,
+            event: str | None = None,
+            urgency: str | None = None
+    ) -> list[dict]:
+        """Alerts matching all the given criteria, in upstream order."""
+        if zone is not None:
+            # A zone code already implies its state.
+            if state is not None and not zone.upper().startswith(state.upper()):
+                return []
+            features = self.by_zone.get(zone.upper(), [])
+        elif state is not None:
+            features = self.by_state.get(state.upper(), [])
+        elif severity is not None:
+            features = self.by_severity.get(severity.capitalize(), [])
+        else:
+            features = self.features
+
+        if severity is not None:
+            features = [f for f in features if f['properties'].get('severity') == severity.capitalize()]
+        if event is not None:
+            features = [f for f in features if (f['properties'].get('event') or '').lower() == event.lower()]
+        if urgency is not None:
+            features = [f for f in features if f['properties'].get('urgency') == urgency.capitalize()]
+        return list(features)
+
+    def alerts_for_point(self, latitude: float, longitude: float, *, zones: typing.Iterable[str] = ()) -> list[dict]:
+        """Alerts whose geometry contains the point.
+
+        Many alerts are issued for zones and have no geometry of their own, those are matched
+        using the zones (UGC codes) that contain the point instead.
+        """
+        found = {id(feature): feature for feature in self.spatial.query(latitude, longitude)}
+        for zone in zones:
+            for feature in self.by_zone.get(zone.upper(), []):
+                if not feature.get('geometry'):
+                    found[id(feature)] = feature
+        return sorted(found.values(), key=lambda feature: self.order[id(feature)])
+
+
+class AlertsIndex:
+    """Periodically fetches all active alerts and swaps in a new snapshot for readers."""
+
+    def __init__(self, fetch: typing.Callable[[], typing.Awaitable[dict | None]], *, interval: float):
+        self.fetch = fetch
+        self.interval = interval
+        self.snapshot: AlertsSnapshot | None = None
+
+    @property
+    def max_age(self) -> float:
+        # Tolerate a couple of failed refreshes before falling back to direct requests.
+        return 3 * self.interval
+
+    def current(self) -> AlertsSnapshot | None:
+        """The latest snapshot, or None if there isn't a recent enough one."""
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.age > self.max_age:
+            return None
+        return snapshot
+
+    async def refresh(self) -> bool:
+        data = await self.fetch()
+        if not data or 'features' not in data:
+            return False
+
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.source is data:
+            # The upstream document was served from cache (or revalidated), so the index is still current.
+            snapshot.created = time.monotonic()
+        else:
+            # Readers keep whichever snapshot they already have; new reads see the new one.
+            self.snapshot = AlertsSnapshot(data['features'], source=data)
+        return True
+
+    async def run(self) -> None:
+        while True:
+            try:
+                if not await self.refresh():
+                    logger.warning('Unable to refresh the active alerts index.')
+            except Exception as e:  # noqa
+                logger.exception('Alerts index refresh failed: %s', str(e))
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,138 @@
+import collections
+import email.utils
+import time
+import typing
+
+
+class TTLCache:
+    """A bounded LRU cache whose entries expire a fixed number of seconds after being set."""
+
+    def __init__(self, *, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: collections.OrderedDict[typing.Hashable, tuple[float, typing.Any]] = collections.OrderedDict()
+
+    def get(self, key: typing.Hashable, default: typing.Any = None) -> typing.Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: typing.Hashable, value: typing.Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: typing.Hashable, default: typing.Any = None) -> typing.Any:
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def freshness_lifetime(headers: typing.Mapping[str, str]) -> float | None:
+    """How many seconds a response may be served without revalidation, or None if it must not be stored.
+
+    The rules are those of a private cache: `private` responses may be stored and `s-maxage` is ignored.
+    """
+    directives = {}
+    for directive in headers.get('Cache-Control', '').split(','):
+        name, _, value = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"')
+
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0.0
+
+    lifetime = 0.0
+    max_age = directives.get('max-age')
+    if max_age:
+        try:
+            lifetime = float(max_age)
+        except ValueError:
+            pass
+    elif headers.get('Expires'):
+        try:
+            expires = email.utils.parsedate_to_datetime(headers['Expires'])
+            date = email.utils.parsedate_to_datetime(headers['Date']) if headers.get('Date') else None
+            lifetime = (expires - date).total_seconds() if date else expires.timestamp() - time.time()
+        except (TypeError, ValueError):
+            pass
+
+    try:
+        lifetime -= float(headers.get('Age', 0))
+    except ValueError:
+        pass
+    return max(lifetime, 0.0)
+
+
+class CachedResponse:
+    """A parsed response body together with the validators needed to revalidate it."""
+
+    def __init__(self, data: typing.Any, *, etag: str | None, last_modified: str | None, lifetime: float):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh_until = time.monotonic() + lifetime
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.fresh_until
+
+    @property
+    def validators(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """Private HTTP cache for parsed JSON responses keyed by URL.
+
+    Fresh entries are served locally, stale ones are kept so they can be revalidated
+    with a conditional request; a 304 reuses the stored body without downloading or parsing it again.
+    """
+
+    def __init__(self, *, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, url: str) -> CachedResponse | None:
+        return self._entries.get(url)
+
+    def store(self, url: str, headers: typing.Mapping[str, str], data: typing.Any) -> None:
+        lifetime = freshness_lifetime(headers)
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if lifetime is None or (not lifetime and not etag and not last_modified):
+            self._entries.pop(url)
+            return
+        self._entries.set(url, CachedResponse(data, etag=etag, last_modified=last_modified, lifetime=lifetime))
+
+    def revalidated(self, url: str, cached: CachedResponse, headers: typing.Mapping[str, str]) -> None:
+        """Refresh an entry after the upstream answered 304 Not Modified."""
+        lifetime = freshness_lifetime(headers)
+        if lifetime is None:
+            self._entries.pop(url)
+            return
+        cached.fresh_until = time.monotonic() + lifetime
+        cached.etag = headers.get('ETag', cached.etag)
+        cached.last_modified = headers.get('Last-Modified', cached.last_modified)
+        self._entries.set(url, cached)
@@ -0,0 +1,101 @@
+import math
+import re
+import typing
+
+import numpy as np
+
+# e.g. PT1H, P1D, P2DT12H, PT30M
+DURATION_PATTERN = re.compile(r'^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?)?$')
+
+# Values of these fields are totals over their interval rather than a state that holds for each hour.
+ACCUMULATED_FIELDS = {'quantitativePrecipitation', 'snowfallAmount', 'iceAccumulation'}
+
+
+def duration_hours(duration: str) -> int:
+    """Length in whole hours (at least one) of an ISO-8601 duration as used by NWS, e.g. P1DT6H."""
+    match = DURATION_PATTERN.match(duration)
+    if not match:
+        raise ValueError(f'Unsupported duration: {duration}')
+    days, hours, minutes = (int(part or 0) for part in match.groups())
+    return max(1, days * 24 + hours + round(minutes / 60))
+
+
+def parse_valid_times(valid_times: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Split NWS validTime intervals ('<start>/<duration>') into start times and durations in hours."""
+    starts, durations = zip(*(valid_time.split('/', 1) for valid_time in valid_times))
+    # NWS grid data is always in UTC, e.g. 2025-06-01T12:00:00+00:00.
+    start_times = np.array([start[:19] for start in starts], dtype='datetime64[h]')
+
+    # There are only a handful of distinct durations, so each one is parsed once.
+    unique, inverse = np.unique(np.array(durations), return_inverse=True)
+    hours = np.array([duration_hours(duration) for duration in unique], dtype=np.int64)[inverse]
+    return start_times, hours
+
+
+def expand_hourly(values: list[dict], start: np.datetime64, hours: int, *, accumulated: bool = False) -> np.ndarray:
+    """Expand a field's interval values onto an hourly axis of `hours` hours beginning at `start`.
+
+    Hours not covered by any interval are NaN.  Accumulated values are spread evenly over their interval.
+    """
+    result = np.full(hours, np.nan)
+    if not values:
+        return result
+
+    start_times, durations = parse_valid_times([value['validTime'] for value in values])
+    data = np.array([np.nan if value['value'] is None else value['value'] for value in values], dtype=np.float64)
+    if accumulated:
+        data = data / durations
+
+    # Position of every hour of every interval relative to `start`.
+    offsets = (start_times - start).astype(np.int64)
+    interval_starts = np.repeat(np.cumsum(durations) - durations, durations)
+    positions = np.repeat(offsets, durations) + (np.arange(durations.sum()) - interval_starts)
+
+    in_range = (positions >= 0) & (positions < hours)
+    result[positions[in_range]] = np.repeat(data, durations)[in_range]
+    return result
+
+
+def is_numeric(values: list[dict]) -> bool:
+    """Whether a field's values are numbers, unlike e.g. the weather and hazards fields."""
+    numbers = [value.get('value') for value in values]
+    return all(
+        isinstance(number, (int, float)) and not isinstance(number, bool) for number in numbers if number is not None
+    )
+
+
+def summarize(values: np.ndarray) -> dict[str, float | None]:
+    """Min, max and mean of the non-missing values."""
+    present = values[~np.isnan(values)]
+    if not present.size:
+        return {'min': None, 'max': None, 'mean': None}
+    return {'min': float(present.min()), 'max': float(present.max()), 'mean': float(present.mean())}
+
+
+def to_list(values: np.ndarray) -> list[float | None]:
+    return [None if math.isnan(value) else value for value in values.tolist()]
+
+
+def hourly_grid(
+        properties: dict[str, typing.Any], fields: list[str], hours: int, start: np.datetime64 | None = None
+) -> dict:
+    """Hourly values and statistics for the requested fields of a forecastGridData document.
+
+    The hourly axis begins at `start`, by default the current hour (UTC).  Fields whose values aren't numbers
+    are listed in `skipped`.
+    """
+    start = np.datetime64('now', 'h') if start is None else start
+    times = start + np.arange(hours).astype('timedelta64[h]')
+    result = {
+        'start': f'{start}:00:00Z', 'times': [f'{t}:00:00Z' for t in times.astype(str)], 'fields': {}, 'skipped': []
+    }
+    for field in fields:
+        layer = properties.get(field)
+        if not isinstance(layer, dict) or 'values' not in layer:
+            continue
+        if not is_numeric(layer['values']):
+            result['skipped'].append(field)
+            continue
+        values = expand_hourly(layer['values'], start, hours, accumulated=field in ACCUMULATED_FIELDS)
+        result['fields'][field] = {'uom': layer.get('uom'), 'values': to_list(values), **summarize(values)}
+    return result
@@ -0,0 +1,80 @@
+import asyncio
+import collections
+import math
+import typing
+
+T = typing.TypeVar('T')
+
+
+class LatencyTracker:
+    """Keeps a window of recently observed latencies to derive timeouts and hedging delays from."""
+
+    def __init__(self, *, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self.samples: collections.deque[float] = collections.deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """The q-th percentile (0-100) of the recent latencies, or None until there are enough samples."""
+        if len(self.samples) < self.min_samples:
+            return None
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, math.ceil(q / 100 * len(samples)) - 1)]
+
+    def timeout(self, *, default: float, minimum: float, maximum: float, factor: float = 3.0) -> float:
+        """A timeout comfortably above the recent p99, within [minimum, maximum]."""
+        p99 = self.percentile(99)
+        if p99 is None:
+            return default
+        return min(maximum, max(minimum, factor * p99))
+
+
+class HedgeBudget:
+    """Caps hedged requests to a fraction of all requests, with a small burst allowance."""
+
+    def __init__(self, *, ratio: float, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst if ratio > 0 else 0.0
+
+    def earn(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+async def hedged(
+        call: typing.Callable[[], typing.Awaitable[T]], *, delay: float | None, budget: HedgeBudget
+) -> T:
+    """Await call(), starting an identical second call if the first hasn't finished after `delay` seconds.
+
+    Whichever call succeeds first wins and the other one is cancelled.
+    """
+    budget.earn()
+    first = asyncio.ensure_future(call())
+    if delay is None:
+        return await first
+
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done or not budget.spend():
+        return await first
+
+    pending = {first, asyncio.ensure_future(call())}
+    try:
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
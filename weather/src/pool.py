@@ -0,0 +1,36 @@
+import importlib.util
+import os
+
+import httpx
+
+# HTTP/2 is only available when the optional `h2` package is installed (httpx[http2]).
+HTTP2 = importlib.util.find_spec('h2') is not None
+
+
+def default_limits() -> httpx.Limits:
+    """Connection pool limits, configurable from the environment."""
+    return httpx.Limits(
+        max_connections=int(os.environ.get('HTTP_MAX_CONNECTIONS', 100)),
+        max_keepalive_connections=int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', 20)),
+        keepalive_expiry=float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', 30.0)),
+    )
+
+
+class ClientPool:
+    """Owns one long-lived httpx.AsyncClient per process so requests reuse keep-alive connections."""
+
+    def __init__(self, *, limits: httpx.Limits | None = None, http2: bool = HTTP2):
+        self.limits = limits or default_limits()
+        self.http2 = http2
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits, http2=self.http2)
+        return self._client
+
+    async def aclose(self) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
@@ -1,35 +1,213 @@
+import asyncio
+import contextlib
 import json
 import logging
+import os
+import time
 import typing
-import httpx
+from urllib.parse import urlencode, urlsplit
+
+import pydantic
 from starlette.responses import PlainTextResponse
 from mcp.server.fastmcp import FastMCP
+from mcp.types import TextContent
+
+from alerts import AlertsIndex
+from cache import HttpCache, TTLCache
+from grid import hourly_grid
+from latency import HedgeBudget, LatencyTracker, hedged
+from pool import ClientPool
+from singleflight import SingleFlight
 
 # Constants
 NWS_API_BASE = 'https://api.weather.gov'
 USER_AGENT = 'weather-mcp/1.0 (jotsu.com, getjotsu@gmail.com)'
 
+# The NWS grid mapping for a location almost never changes, so /points lookups are cached for a long time.
+# NWS itself only uses 4 decimal places for coordinates.
+GRID_POINT_PRECISION = 4
+GRID_POINT_TTL = 7 * 24 * 60 * 60
+GRID_POINT_CACHE_SIZE = 4096
+
+grid_points = TTLCache(maxsize=GRID_POINT_CACHE_SIZE, ttl=GRID_POINT_TTL)
+
+# Responses are kept (with their ETag/Last-Modified validators) for up to a day so stale entries can be revalidated.
+HTTP_CACHE_SIZE = 1024
+HTTP_CACHE_TTL = 24 * 60 * 60
+
+http_cache = HttpCache(maxsize=HTTP_CACHE_SIZE, ttl=HTTP_CACHE_TTL)
+
+# Concurrent requests for the same URL (e.g. a state's alerts during a storm) share a single upstream call.
+in_flight = SingleFlight()
+
+# Timeouts adapt to recently observed NWS latency, per endpoint.  Once a request takes longer than the recent p95
+# of its endpoint, an identical one is sent and whichever answers first is used, for at most NWS_HEDGE_RATIO of
+# requests.
+NWS_TIMEOUT = 30.0
+NWS_MIN_TIMEOUT = 5.0
+NWS_HEDGE_RATIO = float(os.environ.get('NWS_HEDGE_RATIO', 0.05))
+# The nationwide alerts are a large download made in the background, so they are never hedged.
+UNHEDGED_ENDPOINTS = {'alerts/active'}
+
+nws_latency: dict[str, LatencyTracker] = {}
+hedge_budget = HedgeBudget(ratio=NWS_HEDGE_RATIO)
+
+# Maximum number of concurrent upstream requests made by a single batch tool call.
+BATCH_CONCURRENCY = 8
+
+# Shared by every tool call in the process and closed when the server shuts down.
+client_pool = ClientPool()
+
+
+def endpoint(url: str, *, conditional: bool = False) -> str:
+    """The kind of NWS request a URL is for, e.g. 'points' or 'gridpoints/forecast', to track latency by.
+
+    Conditional requests are tracked separately, since a 304 answer is much faster than a full response.
+    """
+    parts = urlsplit(url)
+    segments = parts.path.strip('/').split('/')
+    if segments[0] == 'gridpoints':
+        # /gridpoints/{office}/{x},{y}[/forecast[/hourly]]
+        name = '/'.join(['gridpoints', *segments[3:]])
+    elif segments[0] == 'alerts':
+        name = 'alerts/query' if parts.query else '/'.join(segments)
+    else:
+        name = segments[0]
+    return f'{name} (conditional)' if conditional else name
+
+
+def latency_tracker(name: str) -> LatencyTracker:
+    tracker = nws_latency.get(name)
+    if tracker is None:
+        tracker = nws_latency[name] = LatencyTracker()
+    return tracker
+
 
 async def make_nws_request(url: str) -> dict[str, typing.Any] | None:
-    """Make a request to the NWS API with proper error handling."""
+    """Make a request to the NWS API with proper error handling.
+
+    Responses are cached according to the upstream Cache-Control headers and revalidated
+    with a conditional request once stale.  Concurrent requests for the same URL are coalesced.
+    The returned data is shared and must not be modified.
+    """
+    cached = http_cache.get(url)
+    if cached is not None and cached.fresh:
+        return cached.data
+
+    return await in_flight.do(url, lambda: fetch_nws(url))
+
+
+async def fetch_nws(url: str) -> dict[str, typing.Any] | None:
+    """Fetch a URL from the NWS API, revalidating any stale cached copy."""
+    cached = http_cache.get(url)
+
     headers = {
         'User-Agent': USER_AGENT,
         'Accept': 'application/geo+json',
-        'Cache-Control': 'no-cache',
         'Feature-Flags': ''
     }
-    async with httpx.AsyncClient() as client:
+    if cached is not None:
+        headers.update(cached.validators)
+
+    name = endpoint(url, conditional=cached is not None)
+    latency = latency_tracker(name)
+    timeout = latency.timeout(default=NWS_TIMEOUT, minimum=NWS_MIN_TIMEOUT, maximum=NWS_TIMEOUT)
+
+    async def attempt():
+        start = time.monotonic()
         try:
-            response = await client.get(url, headers=headers, timeout=30.0)
-            if response.status_code != 200:
-                logging.error(json.dumps(dict(response.headers)))
-                logging.error(response.text)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:  # noqa
-            logging.error(e)
+            result = await client_pool.client.get(url, headers=headers, timeout=timeout)
+        except Exception:
+            # Failures and timeouts count too, or the percentiles would only reflect the requests that went well.
+            latency.observe(time.monotonic() - start)
+            raise
+        latency.observe(time.monotonic() - start)
+        return result
+
+    try:
+        hedge = NWS_HEDGE_RATIO > 0 and endpoint(url) not in UNHEDGED_ENDPOINTS
+        delay = latency.percentile(95) if hedge else None
+        response = await hedged(attempt, delay=delay, budget=hedge_budget)
+        if response.status_code == 304 and cached is not None:
+            http_cache.revalidated(url, cached, response.headers)
+            return cached.data
+        if response.status_code != 200:
+            logging.error(json.dumps(dict(response.headers)))
+            logging.error(response.text)
+        response.raise_for_status()
+        data = response.json()
+        http_cache.store(url, response.headers, data)
+        return data
+    except Exception as e:  # noqa
+        logging.error(e)
+        return None
+
+
+async def fetch_active_alerts() -> dict[str, typing.Any] | None:
+    return await make_nws_request(f'{NWS_API_BASE}/alerts/active')
+
+
+# When enabled, all active alerts are fetched on a schedule and get_alerts is answered from an in-memory index.
+# Set NWS_ALERTS_REFRESH_INTERVAL=0 to always query NWS directly.
+ALERTS_REFRESH_INTERVAL = float(os.environ.get('NWS_ALERTS_REFRESH_INTERVAL', 60))
+
+alerts_index = AlertsIndex(fetch_active_alerts, interval=ALERTS_REFRESH_INTERVAL)
+
+
+async def gather_bounded(aws: typing.Iterable[typing.Awaitable], limit: int) -> list:
+    """Like asyncio.gather, but with at most `limit` awaitables running at once."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in aws))
+
+
+def grid_point_key(latitude: float, longitude: float) -> tuple[float, float]:
+    return round(latitude, GRID_POINT_PRECISION), round(longitude, GRID_POINT_PRECISION)
+
+
+async def get_grid_point(latitude: float, longitude: float) -> dict[str, typing.Any] | None:
+    """Get the forecast URLs and zones of the NWS grid point containing a location."""
+    key = grid_point_key(latitude, longitude)
+    point = grid_points.get(key)
+    if point is None:
+        points_data = await make_nws_request(f'{NWS_API_BASE}/points/{key[0]},{key[1]}')
+        if not points_data:
             return None
 
+        props = points_data['properties']
+        point = {
+            'forecast': props.get('forecast'),
+            'forecastHourly': props.get('forecastHourly'),
+            'forecastGridData': props.get('forecastGridData'),
+            # Zone URLs end with the zone's UGC code, e.g. https://api.weather.gov/zones/forecast/NYZ072
+            'zones': [
+                props[name].rstrip('/').rsplit('/', 1)[-1]
+                for name in ('forecastZone', 'county', 'fireWeatherZone') if props.get(name)
+            ],
+        }
+        grid_points.set(key, point)
+    return point
+
+
+def format_forecast(forecast_data: dict) -> str:
+    """Format the first periods of a forecast into a readable string."""
+    periods = forecast_data['properties']['periods']
+    forecasts = []
+    for period in periods[:5]:  # Only show next 5 periods
+        forecast = f"""
+    {period['name']}:
+    Temperature: {period['temperature']}°{period['temperatureUnit']}
+    Wind: {period['windSpeed']} {period['windDirection']}
+    Forecast: {period['detailedForecast']}
+    """
+        forecasts.append(forecast)
+
+    return '\n---\n'.join(forecasts)
+
 
 def format_alert(feature: dict) -> str:
     """Format an alert feature into a readable string."""
@@ -43,29 +221,247 @@ Instructions: {props.get('instruction', 'No specific instructions provided')}
 """
 
 
+class Location(pydantic.BaseModel):
+    latitude: float
+    longitude: float
+
+
+AlertSeverity = typing.Literal['Extreme', 'Severe', 'Moderate', 'Minor', 'Unknown']
+AlertUrgency = typing.Literal['Immediate', 'Expected', 'Future', 'Past', 'Unknown']
+
+DEFAULT_ALERTS_LIMIT = 25
+
+
+class Alert(pydantic.BaseModel):
+    id: str | None = None
+    event: str | None = None
+    area: str | None = None
+    severity: str | None = None
+    urgency: str | None = None
+    certainty: str | None = None
+    headline: str | None = None
+    description: str | None = None
+    instruction: str | None = None
+    effective: str | None = None
+    expires: str | None = None
+
+    @classmethod
+    def from_feature(cls, feature: dict) -> 'Alert':
+        props = feature['properties']
+        return cls(
+            id=props.get('id') or feature.get('id'),
+            event=props.get('event'),
+            area=props.get('areaDesc'),
+            severity=props.get('severity'),
+            urgency=props.get('urgency'),
+            certainty=props.get('certainty'),
+            headline=props.get('headline'),
+            description=props.get('description'),
+            instruction=props.get('instruction'),
+            effective=props.get('effective'),
+            expires=props.get('expires'),
+        )
+
+
+class AlertsPage(pydantic.BaseModel):
+    alerts: list[Alert]
+    total: int
+    next_cursor: str | None = None
+
+
+DEFAULT_GRID_FIELDS = [
+    'temperature', 'dewpoint', 'relativeHumidity', 'windSpeed',
+    'probabilityOfPrecipitation', 'quantitativePrecipitation', 'skyCover'
+]
+MAX_GRID_HOURS = 7 * 24
+
+
+class GridField(pydantic.BaseModel):
+    uom: str | None = None
+    values: list[float | None]
+    min: float | None = None
+    max: float | None = None
+    mean: float | None = None
+
+
+class HourlyGrid(pydantic.BaseModel):
+    start: str
+    times: list[str]
+    fields: dict[str, GridField]
+    # Requested fields whose values aren't numbers, e.g. weather and hazards.
+    skipped: list[str] = []
+
+
 DEFAULT_PORT = 8000
 
 
-def setup_server():
-    mcp = FastMCP('NWS Weather MCP Server', stateless_http=True, port=DEFAULT_PORT)
+class WeatherServer(FastMCP):
 
-    @mcp.tool()
-    async def get_alerts(state: str) -> str:
-        """Get weather alerts for a US state.
+    def __init__(self, *args, refresh_alerts: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.refresh_alerts = refresh_alerts and ALERTS_REFRESH_INTERVAL > 0
 
-        Args:
-            state: Two-letter US state code (e.g. CA, NY)
+    @contextlib.asynccontextmanager
+    async def process_lifespan(self):
+        """Process-wide resources.
+
+        The FastMCP lifespan runs once per MCP session, which is once per request in stateless mode,
+        so anything shared across requests is tied to the lifespan of the HTTP app instead.
         """
-        url = f'{NWS_API_BASE}/alerts/active/area/{state}'
+        refresher = asyncio.create_task(alerts_index.run()) if self.refresh_alerts else None
+        try:
+            yield
+        finally:
+            if refresher is not None:
+                refresher.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await refresher
+            await client_pool.aclose()
+
+    async def call_tool(self, name: str, arguments: dict[str, typing.Any]):
+        """Call a tool.  The text copy of a structured (model) result is compact JSON rather than pretty-printed."""
+        result = await super().call_tool(name, arguments)
+        tool = self._tool_manager.get_tool(name)
+        if isinstance(result, tuple) and tool is not None and not tool.fn_metadata.wrap_output:
+            structured = result[1]
+            return [TextContent(type='text', text=json.dumps(structured, separators=(',', ':')))], structured
+        return result
+
+    def streamable_http_app(self):
+        app = super().streamable_http_app()
+        session_lifespan = app.router.lifespan_context
+
+        @contextlib.asynccontextmanager
+        async def lifespan(starlette_app):
+            async with self.process_lifespan(), session_lifespan(starlette_app) as state:
+                yield state
+
+        app.router.lifespan_context = lifespan
+        return app
+
+
+def setup_server(*, refresh_alerts: bool = True):
+    """Create the server.  Without refresh_alerts, alerts are always requested from NWS directly."""
+    mcp = WeatherServer(
+        'NWS Weather MCP Server', stateless_http=True, port=DEFAULT_PORT, refresh_alerts=refresh_alerts
+    )
+
+    async def find_alerts(
+            state: str, severity: str | None, event: str | None, urgency: str | None
+    ) -> list[dict] | None:
+        """The active alerts of a state matching the filters, or None if NWS can't be reached."""
+        snapshot = alerts_index.current()
+        if snapshot is not None:
+            return snapshot.alerts(state=state, severity=severity, event=event, urgency=urgency)
+
+        # No recent nationwide snapshot (or the refresher is disabled), so ask NWS directly.
+        params = {'area': state.upper(), 'severity': severity, 'event': event, 'urgency': urgency}
+        url = f'{NWS_API_BASE}/alerts/active?' + urlencode({k: v for k, v in params.items() if v})
         data = await make_nws_request(url)
 
         if not data or 'features' not in data:
-            return 'Unable to fetch alerts or no alerts found.'
+            return None
+        return data['features']
+
+    def parse_cursor(cursor: str | None) -> int:
+        try:
+            offset = int(cursor) if cursor else 0
+        except ValueError:
+            offset = -1
+        if offset < 0:
+            raise ValueError(f'Invalid cursor: {cursor}')
+        return offset
 
-        if not data['features']:
+    # The text is the whole result, so it isn't duplicated as structured content.
+    @mcp.tool(structured_output=False)
+    async def get_alerts(
+            state: str,
+            severity: AlertSeverity | None = None,
+            event: str | None = None,
+            urgency: AlertUrgency | None = None,
+            limit: int = DEFAULT_ALERTS_LIMIT,
+            cursor: str | None = None
+    ) -> str:
+        """Get weather alerts for a US state.
+
+        Args:
+            state: Two-letter US state code (e.g. CA, NY)
+            severity: Only return alerts with this severity
+            event: Only return alerts for this event type (e.g. Tornado Warning)
+            urgency: Only return alerts with this urgency
+            limit: Maximum number of alerts to return
+            cursor: The cursor returned by a previous call, to get the next alerts
+        """
+        offset = parse_cursor(cursor)
+        features = await find_alerts(state, severity, event, urgency)
+        if features is None:
+            return 'Unable to fetch alerts or no alerts found.'
+        if not features:
             return 'No active alerts for this state.'
 
-        alerts = [format_alert(feature) for feature in data['features']]
+        end = offset + max(limit, 1)
+        page = features[offset:end]
+        if not page:
+            # The alerts may have changed since the cursor was returned.
+            return f'No more alerts: cursor={cursor} is past the {len(features)} active alerts for this state.'
+
+        alerts = [format_alert(feature) for feature in page]
+        if end < len(features):
+            alerts.append(f'Showing alerts {offset + 1}-{end} of {len(features)}, use cursor={end} for more.')
+        return '\n---\n'.join(alerts)
+
+    @mcp.tool()
+    async def get_alerts_structured(
+            state: str,
+            severity: AlertSeverity | None = None,
+            event: str | None = None,
+            urgency: AlertUrgency | None = None,
+            limit: int = DEFAULT_ALERTS_LIMIT,
+            cursor: str | None = None
+    ) -> AlertsPage:
+        """Get weather alerts for a US state as objects, with the total number of alerts and the next cursor.
+
+        Args:
+            state: Two-letter US state code (e.g. CA, NY)
+            severity: Only return alerts with this severity
+            event: Only return alerts for this event type (e.g. Tornado Warning)
+            urgency: Only return alerts with this urgency
+            limit: Maximum number of alerts to return
+            cursor: The next_cursor returned by a previous call, to get the next alerts
+        """
+        offset = parse_cursor(cursor)
+        features = await find_alerts(state, severity, event, urgency)
+        if features is None:
+            raise RuntimeError('Unable to fetch alerts.')
+
+        end = offset + max(limit, 1)
+        alerts = [Alert.from_feature(feature) for feature in features[offset:end]]
+        return AlertsPage(alerts=alerts, total=len(features), next_cursor=str(end) if end < len(features) else None)
+
+    @mcp.tool()
+    async def get_alerts_for_point(latitude: float, longitude: float) -> str:
+        """Get the weather alerts in effect at a given US location.
+
+        Args:
+            latitude: Latitude of the location
+            longitude: Longitude of the location
+        """
+        snapshot = alerts_index.current()
+        if snapshot is not None:
+            point = await get_grid_point(latitude, longitude)
+            features = snapshot.alerts_for_point(latitude, longitude, zones=point['zones'] if point else ())
+        else:
+            latitude, longitude = grid_point_key(latitude, longitude)
+            data = await make_nws_request(f'{NWS_API_BASE}/alerts/active?point={latitude},{longitude}')
+
+            if not data or 'features' not in data:
+                return 'Unable to fetch alerts or no alerts found.'
+            features = data['features']
+
+        if not features:
+            return 'No active alerts for this location.'
+
+        alerts = [format_alert(feature) for feature in features]
         return '\n---\n'.join(alerts)
 
     @mcp.tool()
@@ -76,33 +472,82 @@ def setup_server():
             latitude: Latitude of the location
             longitude: Longitude of the location
         """
-        # First get the forecast grid endpoint
-        points_url = f'{NWS_API_BASE}/points/{latitude},{longitude}'
-        points_data = await make_nws_request(points_url)
+        # First get the forecast grid endpoint (usually cached)
+        point = await get_grid_point(latitude, longitude)
 
-        if not points_data:
+        if not point or not point['forecast']:
             return 'Unable to fetch forecast data for this location.'
 
-        # Get the forecast URL from the points response
-        forecast_url = points_data['properties']['forecast']
-        forecast_data = await make_nws_request(forecast_url)
+        forecast_data = await make_nws_request(point['forecast'])
 
         if not forecast_data:
             return 'Unable to fetch detailed forecast.'
 
-        # Format the periods into a  readable forecast
-        periods = forecast_data['properties']['periods']
-        forecasts = []
-        for period in periods[:5]:  # Only show next 5 periods
-            forecast = f"""
-    {period['name']}:
-    Temperature: {period['temperature']}°{period['temperatureUnit']}
-    Wind: {period['windSpeed']} {period['windDirection']}
-    Forecast: {period['detailedForecast']}
-    """
-            forecasts.append(forecast)
+        return format_forecast(forecast_data)
+
+    @mcp.tool()
+    async def get_hourly_grid(
+            latitude: float,
+            longitude: float,
+            fields: typing.List[str] | None = None,
+            hours: int = 24
+    ) -> str | HourlyGrid:
+        """Get hourly gridded forecast values with their min/max/mean for a given US location.
+
+        Args:
+            latitude: Latitude of the location
+            longitude: Longitude of the location
+            fields: NWS grid fields with numeric values to include (e.g. temperature, windSpeed, skyCover)
+            hours: Number of hours from now to include (at most 168)
+        """
+        point = await get_grid_point(latitude, longitude)
+
+        if not point or not point['forecastGridData']:
+            return 'Unable to fetch forecast data for this location.'
+
+        grid_data = await make_nws_request(point['forecastGridData'])
+
+        if not grid_data:
+            return 'Unable to fetch gridded forecast.'
+
+        hours = min(max(hours, 1), MAX_GRID_HOURS)
+        return HourlyGrid(**hourly_grid(grid_data['properties'], fields or DEFAULT_GRID_FIELDS, hours))
+
+    @mcp.tool()
+    async def get_forecasts(locations: typing.List[Location]) -> str:
+        """Get the weather forecasts for several US locations at once.
+        Results are returned in the same order as the locations.
+
+        Args:
+            locations: The latitude and longitude of each location
+        """
+        # Resolve each distinct grid point once, concurrently.
+        keys = [grid_point_key(location.latitude, location.longitude) for location in locations]
+        unique_keys = list(dict.fromkeys(keys))
+        points = dict(zip(unique_keys, await gather_bounded(
+            (get_grid_point(*key) for key in unique_keys), BATCH_CONCURRENCY
+        )))
+
+        # Locations in the same grid cell share a forecast URL, so each forecast is only fetched once.
+        forecast_urls = list(dict.fromkeys(
+            point['forecast'] for point in points.values() if point and point['forecast']
+        ))
+        forecasts = dict(zip(forecast_urls, await gather_bounded(
+            (make_nws_request(url) for url in forecast_urls), BATCH_CONCURRENCY
+        )))
+
+        results = []
+        for location, key in zip(locations, keys):
+            point = points[key]
+            if not point or not point['forecast']:
+                result = 'Unable to fetch forecast data for this location.'
+            elif not forecasts[point['forecast']]:
+                result = 'Unable to fetch detailed forecast.'
+            else:
+                result = format_forecast(forecasts[point['forecast']])
+            results.append(f'Location: {location.latitude}, {location.longitude}\n{result}')
 
-        return '\n---\n'.join(forecasts)
+        return '\n===\n'.join(results)
 
     @mcp.custom_route('/', methods=['GET'])
     async def root(*_args):
@@ -0,0 +1,28 @@
+import asyncio
+import typing
+
+T = typing.TypeVar('T')
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key so they share one in-flight call and its result."""
+
+    def __init__(self):
+        self._calls: dict[typing.Hashable, asyncio.Future] = {}
+
+    async def do(self, key: typing.Hashable, fn: typing.Callable[[], typing.Awaitable[T]]) -> T:
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._forget(key, future))
+
+        # A caller giving up (e.g. a cancelled tool call) must not cancel the call for everyone else.
+        return await asyncio.shield(future)
+
+    def _forget(self, key: typing.Hashable, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,86 @@
+import math
+import typing
+
+# GeoJSON positions are [longitude, latitude].
+Ring = typing.Sequence[typing.Sequence[float]]
+BBox = tuple[float, float, float, float]
+
+
+def polygons(geometry: dict | None) -> list[list[Ring]]:
+    """The polygons (each a list of rings, the first being the exterior) of a GeoJSON geometry."""
+    if not geometry:
+        return []
+    match geometry.get('type'):
+        case 'Polygon':
+            return [geometry['coordinates']]
+        case 'MultiPolygon':
+            return list(geometry['coordinates'])
+        case 'GeometryCollection':
+            return [polygon for g in geometry.get('geometries', []) for polygon in polygons(g)]
+    return []
+
+
+def bounding_box(rings: typing.Iterable[Ring]) -> BBox:
+    lons = [position[0] for ring in rings for position in ring]
+    lats = [position[1] for ring in rings for position in ring]
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+def in_ring(longitude: float, latitude: float, ring: Ring) -> bool:
+    """Ray casting test of a point against a single closed ring."""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > latitude) != (yj > latitude):
+            if longitude < (xj - xi) * (latitude - yi) / (yj - yi) + xi:
+                inside = not inside
+        j = i
+    return inside
+
+
+def in_polygon(longitude: float, latitude: float, polygon: list[Ring]) -> bool:
+    exterior, holes = polygon[0], polygon[1:]
+    if not in_ring(longitude, latitude, exterior):
+        return False
+    return not any(in_ring(longitude, latitude, hole) for hole in holes)
+
+
+class SpatialIndex:
+    """A uniform grid over polygon bounding boxes.
+
+    A lookup only runs exact point-in-polygon tests against the polygons whose bounding box
+    covers the grid cell (and the point) being queried.
+    """
+
+    def __init__(self, features: typing.Iterable[dict], *, cell_size: float = 1.0):
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], list[tuple[BBox, list[Ring], dict]]] = {}
+
+        for feature in features:
+            for polygon in polygons(feature.get('geometry')):
+                if not polygon or not polygon[0]:
+                    continue
+                bbox = bounding_box(polygon[:1])
+                entry = (bbox, polygon, feature)
+                x0, y0 = self._cell(bbox[0], bbox[1])
+                x1, y1 = self._cell(bbox[2], bbox[3])
+                for x in range(x0, x1 + 1):
+                    for y in range(y0, y1 + 1):
+                        self.cells.setdefault((x, y), []).append(entry)
+
+    def _cell(self, longitude: float, latitude: float) -> tuple[int, int]:
+        return math.floor(longitude / self.cell_size), math.floor(latitude / self.cell_size)
+
+    def query(self, latitude: float, longitude: float) -> list[dict]:
+        """Features with a polygon containing the point, without duplicates."""
+        found = {}
+        for bbox, polygon, feature in self.cells.get(self._cell(longitude, latitude), []):
+            if id(feature) in found:
+                continue
+            if not (bbox[0] <= longitude <= bbox[2] and bbox[1] <= latitude <= bbox[3]):
+                continue
+            if in_polygon(longitude, latitude, polygon):
+                found[id(feature)] = feature
+        return list(found.values())
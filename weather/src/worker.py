@@ -58,6 +58,7 @@ async def on_fetch(request, env, ctx):
     httpx_client = MockHttpxAsyncClient()
     httpx.AsyncClient.get = httpx_client.get
 
-    mcp = setup_server()
+    # A new app is made for every request here, so there is no long-lived process to refresh the alerts in.
+    mcp = setup_server(refresh_alerts=False)
     app = mcp.streamable_http_app()
     return await asgi.fetch(app, request, env, ctx)